@@ -0,0 +1,805 @@
+import argparse
+import collections
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+from vosk import Model, KaldiRecognizer, SetLogLevel
+
+from tests.phrases import build_phrases
+from voice_shock_control import (NUMBER_TENS, NUMBER_UNITS, VERSION, CommandParser,
+                                 RecognitionEngine, StreamingResampler, build_command_grammar,
+                                 get_model_path, load_config_file, model_supports_grammar)
+
+# Benchmarks for PupShock Voice
+#
+# Fixtures are described by a manifest JSON file next to the WAV files:
+#   [{"file": "shock_fifty.wav", "intensity": 50},
+#    {"file": "chatter.wav", "intensity": null}]
+# Entries with a null intensity contain no command, so any trigger in them
+# counts as a false trigger. An optional "speech_end" (seconds into the file)
+# overrides the energy based end of speech used for detection latency.
+
+
+def load_manifest(manifest_path):
+    # Load fixture list, resolving files relative to the manifest
+    with open(manifest_path, 'r') as f:
+        entries = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for entry in entries:
+        entry["path"] = os.path.join(base_dir, entry["file"])
+    return entries
+
+
+def read_wav(path):
+    # Read the first channel of a 16-bit WAV file as int16 samples and its rate
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels)[:, 0]
+
+    return samples, rate
+
+
+def read_wav_16k(path):
+    # Read a mono 16-bit WAV file as int16 samples at 16kHz
+    samples, rate = read_wav(path)
+
+    if rate != 16000:
+        resampler = StreamingResampler(rate)
+        audio = resampler.process(samples.astype(np.float32) / 32768)
+        samples = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+    return samples
+
+
+def write_wav(path, samples, rate):
+    # Write float32 samples as a mono 16-bit WAV file
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+
+def decode_file(recognizer, samples, wake_word, block_samples=1600):
+    # Feed samples to the recognizer, return decode time and triggered intensities
+    triggers = []
+    decode_time = 0.0
+    parser = CommandParser(wake_word)
+
+    def check(result_json):
+        text = json.loads(result_json).get("text", "").lower().strip()
+        command = parser.parse(text)
+        if command is not None and command.intensity is not None:
+            triggers.append(command.intensity)
+
+    for start in range(0, len(samples), block_samples):
+        block = samples[start:start + block_samples].tobytes()
+        t0 = time.perf_counter()
+        final = recognizer.AcceptWaveform(block)
+        decode_time += time.perf_counter() - t0
+        if final:
+            check(recognizer.Result())
+
+    t0 = time.perf_counter()
+    result = recognizer.FinalResult()
+    decode_time += time.perf_counter() - t0
+    check(result)
+
+    return decode_time, triggers
+
+
+def bench_grammar(args):
+    # Compare open vocabulary and command grammar recognizers
+    model = Model(args.model)
+    entries = load_manifest(args.manifest)
+    fixtures = [(entry, read_wav_16k(entry["path"])) for entry in entries]
+    audio_seconds = sum(len(samples) for _, samples in fixtures) / 16000
+
+    modes = {"open": None}
+    if model_supports_grammar(args.model):
+        modes["grammar"] = json.dumps(build_command_grammar(args.wake_word))
+    else:
+        print("Model has a static graph, command grammar is not supported", file=sys.stderr)
+
+    report = {}
+    for mode, grammar in modes.items():
+        total_decode = 0.0
+        correct = 0
+        false_triggers = 0
+        positives = 0
+
+        for entry, samples in fixtures:
+            if grammar is None:
+                recognizer = KaldiRecognizer(model, 16000)
+            else:
+                recognizer = KaldiRecognizer(model, 16000, grammar)
+
+            decode_time, triggers = decode_file(recognizer, samples, args.wake_word)
+            total_decode += decode_time
+
+            expected = entry.get("intensity")
+            if expected is None:
+                false_triggers += len(triggers)
+            else:
+                positives += 1
+                if expected in triggers:
+                    correct += 1
+                false_triggers += sum(1 for value in triggers if value != expected)
+
+        report[mode] = {
+            "real_time_factor": total_decode / audio_seconds,
+            "audio_seconds": audio_seconds,
+            "commands_recognized": correct,
+            "commands_expected": positives,
+            "false_triggers": false_triggers,
+            "false_triggers_per_hour": false_triggers / audio_seconds * 3600
+        }
+
+    for mode, stats in report.items():
+        print(f"{mode:>8}: RTF {stats['real_time_factor']:.3f}  "
+              f"recognized {stats['commands_recognized']}/{stats['commands_expected']}  "
+              f"false triggers {stats['false_triggers']} "
+              f"({stats['false_triggers_per_hour']:.1f}/h)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+def legacy_resample_to_16k(audio, src_rate):
+    # Per-chunk np.interp resampler used before StreamingResampler
+    target_rate = 16000
+    if src_rate == target_rate:
+        return audio
+    duration = len(audio) / src_rate
+    target_len = int(duration * target_rate)
+    x_old = np.linspace(0, duration, len(audio), endpoint=False)
+    x_new = np.linspace(0, duration, target_len, endpoint=False)
+    return np.interp(x_new, x_old, audio).astype(np.float32)
+
+
+def resample_snr(output, freq, skip=200):
+    # SNR of a resampled sine against the exact 16kHz reference
+    t = np.arange(len(output)) / 16000
+    reference = np.sin(2 * np.pi * freq * t)
+    error = output[skip:-skip] - reference[skip:-skip]
+    return 10 * np.log10(np.mean(reference[skip:-skip] ** 2) / np.mean(error ** 2))
+
+
+def bench_resample(args):
+    # Throughput and accuracy of the legacy and streaming resamplers
+    report = {}
+    for rate in args.rates:
+        total = rate * args.seconds
+        blocks = [(np.sin(2 * np.pi * args.freq * (np.arange(start, min(start + args.chunk_size, total)) / rate))
+                   .astype(np.float32)) for start in range(0, total, args.chunk_size)]
+
+        resampler = StreamingResampler(rate)
+        implementations = {
+            "legacy": lambda block: legacy_resample_to_16k(block, rate),
+            "streaming": lambda block: resampler.process(block).copy()
+        }
+
+        for name, resample in implementations.items():
+            t0 = time.perf_counter()
+            output = np.concatenate([resample(block) for block in blocks])
+            elapsed = time.perf_counter() - t0
+
+            report[f"{name}_{rate}"] = {
+                "realtime_speed": args.seconds / elapsed,
+                "us_per_block": elapsed / len(blocks) * 1e6,
+                "output_samples": len(output),
+                "expected_samples": args.seconds * 16000,
+                "snr_db": resample_snr(output, args.freq)
+            }
+
+    for key, stats in report.items():
+        print(f"{key:>16}: {stats['us_per_block']:7.1f} us/block  "
+              f"{stats['realtime_speed']:8.0f}x realtime  "
+              f"samples {stats['output_samples']}/{stats['expected_samples']}  "
+              f"SNR {stats['snr_db']:.1f} dB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+def speech_end(samples, rate, frame_ms=20):
+    # Time in seconds where the last frame above 10% of the loudest frame ends
+    frame = int(rate * frame_ms / 1000)
+    count = len(samples) // frame
+    if not count:
+        return len(samples) / rate
+    frames = samples[:count * frame].astype(np.float64).reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    active = np.nonzero(rms > 0.1 * rms.max())[0]
+    if not len(active):
+        return len(samples) / rate
+    return (active[-1] + 1) * frame / rate
+
+
+def pink_noise(count, rng):
+    # Unit RMS 1/f noise, shaped in the frequency domain
+    spectrum = np.fft.rfft(rng.standard_normal(count))
+    freqs = np.arange(len(spectrum))
+    freqs[0] = 1
+    noise = np.fft.irfft(spectrum / np.sqrt(freqs), n=count)
+    return noise / np.sqrt(np.mean(noise ** 2))
+
+
+def build_corpus(entries, rates, snrs, noise_path=None, lead_s=1.0, tail_s=1.5, seed=1234):
+    # Place each clip between noise padding at every rate and SNR, returns
+    # (rate, snr, entry, samples, speech_end_seconds) tuples
+    rng = np.random.default_rng(seed)
+    noise_bed = None
+    if noise_path:
+        noise_samples, noise_rate = read_wav(noise_path)
+        noise_bed = (noise_samples.astype(np.float32) / 32768, noise_rate)
+
+    corpus = []
+    for entry in entries:
+        clip, clip_rate = read_wav(entry["path"])
+        clip = clip.astype(np.float32) / 32768
+        end = entry.get("speech_end", speech_end(clip, clip_rate))
+
+        # Speech level measured on the active part of the clip
+        active = clip[np.abs(clip) > 0.1 * np.abs(clip).max()] if clip.any() else clip
+        speech_rms = np.sqrt(np.mean(active.astype(np.float64) ** 2)) if len(active) else 0.0
+
+        for rate in rates:
+            if clip_rate == rate:
+                audio = clip.copy()
+            else:
+                audio = StreamingResampler(clip_rate, rate).process(clip).copy()
+
+            lead = int(lead_s * rate)
+            audio = np.concatenate([np.zeros(lead, dtype=np.float32), audio,
+                                    np.zeros(int(tail_s * rate), dtype=np.float32)])
+
+            for snr in snrs:
+                if snr is None:
+                    noisy = audio
+                else:
+                    if noise_bed is None:
+                        noise = pink_noise(len(audio), rng)
+                    else:
+                        bed, bed_rate = noise_bed
+                        if bed_rate != rate:
+                            bed = StreamingResampler(bed_rate, rate).process(bed).copy()
+                        noise = np.resize(bed, len(audio)).astype(np.float64)
+                        noise /= max(np.sqrt(np.mean(noise ** 2)), 1e-9)
+                    noisy = (audio + noise * speech_rms / 10 ** (snr / 20)).astype(np.float32)
+
+                corpus.append((rate, snr, entry, noisy, lead_s + end))
+
+    return corpus
+
+
+class StageClock:
+    # Thread CPU time per pipeline stage
+    def __init__(self):
+        self.cpu = collections.defaultdict(float)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            t0 = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.cpu[stage] += time.thread_time() - t0
+        return timed
+
+
+class TimedRecognizer:
+    # Recognizer proxy charging Vosk calls to the decode stage
+    DECODE_CALLS = ("AcceptWaveform", "Result", "PartialResult", "FinalResult", "Reset")
+
+    def __init__(self, recognizer, clock):
+        self.recognizer = recognizer
+        self.clock = clock
+
+    def __getattr__(self, name):
+        attr = getattr(self.recognizer, name)
+        if name in self.DECODE_CALLS:
+            return self.clock.wrap("decode", attr)
+        return attr
+
+
+class TimedEngine(RecognitionEngine):
+    # RecognitionEngine with per-stage CPU accounting
+    def __init__(self, config, clock, on_command=None):
+        super().__init__(config, log=lambda *args, **kwargs: None, on_command=on_command)
+        self.clock = clock
+        self.to_int16 = clock.wrap("int16_convert", super().to_int16)
+        self.parse_command = clock.wrap("command_parse", self.parse_command)
+
+    def create_capture_source(self, rate):
+        source = super().create_capture_source(rate)
+        resampler = source["resampler"]
+        resampler.process = self.clock.wrap("resample", resampler.process)
+        return source
+
+    def create_recognizer(self, announce=False):
+        return TimedRecognizer(super().create_recognizer(announce), self.clock)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def bench_pipeline(args):
+    # End-to-end engine run over a noisy multi-rate corpus
+    config = load_config_file(args.config)
+    if args.chunk_size:
+        config["chunk_size"] = args.chunk_size
+    if args.model_size:
+        config["model_size"] = args.model_size
+    model_path = args.model or get_model_path(config["model_size"])
+
+    snrs = [None if snr.lower() == "clean" else float(snr) for snr in args.snr]
+    corpus = build_corpus(load_manifest(args.manifest), args.rates, snrs, args.noise)
+
+    if args.save_corpus:
+        os.makedirs(args.save_corpus, exist_ok=True)
+        for rate, snr, entry, samples, _ in corpus:
+            name = os.path.splitext(entry["file"])[0]
+            label = "clean" if snr is None else f"{snr:g}dB"
+            write_wav(os.path.join(args.save_corpus, f"{name}_{rate}_{label}.wav"), samples, rate)
+
+    t0 = time.perf_counter()
+    model = Model(model_path)
+    load_seconds = time.perf_counter() - t0
+
+    groups = collections.OrderedDict()
+    for rate, snr, entry, samples, end_time in corpus:
+        key = f"{rate}Hz_{'clean' if snr is None else f'{snr:g}dB'}"
+        group = groups.setdefault(key, {
+            "clock": StageClock(), "wall": 0.0, "cpu": 0.0, "audio": 0.0,
+            "correct": 0, "expected": 0, "false": 0, "latencies": []
+        })
+
+        position = {"time": 0.0}
+        fired = []
+
+        def on_command(command, trigger, speech_time):
+            fired.append((command.intensity, position["time"]))
+
+        engine = TimedEngine(config, group["clock"], on_command=on_command)
+        engine.start_session(model, model_path)
+        engine.add_source("corpus", rate, primary=True)
+
+        block_size = config["chunk_size"]
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        for start in range(0, len(samples), block_size):
+            block = samples[start:start + block_size]
+            position["time"] = (start + len(block)) / rate
+            engine.feed("corpus", block, position["time"])
+        engine.flush()
+        group["cpu"] += time.thread_time() - cpu_start
+        group["wall"] += time.perf_counter() - wall_start
+        group["audio"] += len(samples) / rate
+
+        expected = entry.get("intensity")
+        if expected is None:
+            group["false"] += len(fired)
+            continue
+
+        group["expected"] += 1
+        hits = [fired_at for intensity, fired_at in fired if intensity == expected]
+        group["false"] += sum(1 for intensity, _ in fired if intensity != expected)
+        if hits:
+            group["correct"] += 1
+            group["latencies"].append((hits[0] - end_time) * 1000)
+
+    report = {
+        "settings": {
+            "version": VERSION,
+            "model": os.path.basename(os.path.normpath(model_path)),
+            "model_load_seconds": load_seconds,
+            "chunk_size": config["chunk_size"],
+            "vad_enabled": config["vad_enabled"],
+            "low_latency_mode": config["low_latency_mode"],
+            "command_grammar": config["command_grammar"],
+            "noise": args.noise or "pink"
+        }
+    }
+    for key, group in groups.items():
+        stages = dict(group["clock"].cpu)
+        stages["other"] = max(0.0, group["cpu"] - sum(stages.values()))
+        latencies = group["latencies"]
+        report[key] = {
+            "audio_seconds": group["audio"],
+            "real_time_factor": group["wall"] / group["audio"],
+            "cpu_ms_per_audio_second": {stage: seconds * 1000 / group["audio"]
+                                        for stage, seconds in stages.items()},
+            "commands_recognized": group["correct"],
+            "commands_expected": group["expected"],
+            "accuracy": group["correct"] / group["expected"] if group["expected"] else None,
+            "false_triggers": group["false"],
+            "latency_ms_p50": percentile(latencies, 50),
+            "latency_ms_p95": percentile(latencies, 95),
+            "latency_ms_max": max(latencies) if latencies else None
+        }
+
+    for key, stats in report.items():
+        if key == "settings":
+            continue
+        stages = "  ".join(f"{stage} {ms:.1f}" for stage, ms in stats["cpu_ms_per_audio_second"].items())
+        latency = "n/a" if stats["latency_ms_p50"] is None else \
+            f"p50 {stats['latency_ms_p50']:.0f} ms p95 {stats['latency_ms_p95']:.0f} ms"
+        print(f"{key:>14}: RTF {stats['real_time_factor']:.3f}  "
+              f"recognized {stats['commands_recognized']}/{stats['commands_expected']}  "
+              f"false triggers {stats['false_triggers']}  latency {latency}")
+        print(f"{'':>14}  CPU ms per audio second: {stages}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+class NullRecognizer:
+    # Vosk stand-in that decodes nothing, isolates conversion and batching cost
+    def AcceptWaveform(self, data):
+        return False
+
+    def Result(self):
+        return '{"text": ""}'
+
+    def PartialResult(self):
+        return '{"partial": ""}'
+
+    def FinalResult(self):
+        return '{"text": ""}'
+
+    def Reset(self):
+        pass
+
+
+def bench_decode(args):
+    # Engine throughput per chunk_size, decode_block_ms and speech gate setting.
+    # With the gate off every block reaches the decoder
+    config = load_config_file(args.config)
+
+    if args.manifest:
+        rate = 16000
+        audio = np.concatenate([read_wav_16k(entry["path"])
+                                for entry in load_manifest(args.manifest)]).astype(np.float32) / 32768
+    else:
+        rate = args.rate
+        rng = np.random.default_rng(1234)
+        audio = 0.1 * pink_noise(rate * args.seconds, rng)
+        if args.speech_duty < 1.0:
+            # Loud bursts for speech_duty of every 4 s, a quiet room in between
+            period = 4 * rate
+            quiet = (np.arange(len(audio)) % period) >= args.speech_duty * period
+            audio[quiet] = 0.002 * pink_noise(int(quiet.sum()), rng)
+    duration = len(audio) / rate
+
+    model = Model(args.model) if args.model else None
+
+    report = {}
+    runs = [(chunk_size, block_ms, vad) for chunk_size in args.chunk_sizes
+            for block_ms in args.block_ms for vad in args.vad]
+    for chunk_size, block_ms, vad in runs:
+        config["chunk_size"] = chunk_size
+        config["decode_block_ms"] = block_ms
+        config["vad_enabled"] = vad == "on"
+        clock = StageClock()
+        engine = TimedEngine(config, clock)
+        if model is None:
+            engine.create_recognizer = lambda announce=False: TimedRecognizer(NullRecognizer(), clock)
+        engine.start_session(model, args.model)
+        engine.add_source("bench", rate, primary=True)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        for start in range(0, len(audio), chunk_size):
+            engine.feed("bench", audio[start:start + chunk_size], start / rate)
+        engine.flush()
+        cpu = time.thread_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        stages = dict(clock.cpu)
+        stages["other"] = max(0.0, cpu - sum(stages.values()))
+        report[f"chunk{chunk_size}_block{block_ms}ms_vad{vad}"] = {
+            "chunk_size": chunk_size,
+            "decode_block_ms": block_ms,
+            "vad": vad,
+            "realtime_speed": duration / wall,
+            "chunks_seen": engine.chunks_seen,
+            "chunks_decoded": engine.decode_calls,
+            "decoder_calls": engine.accept_calls,
+            "cpu_ms_per_audio_second": {stage: seconds * 1000 / duration for stage, seconds in stages.items()}
+        }
+
+    decoder = "Vosk" if model else "null decoder"
+    print(f"{duration:.0f} s of {rate} Hz audio, {decoder}")
+    for key, stats in report.items():
+        cpu = ", ".join(f"{stage} {ms:.1f}" for stage, ms in stats["cpu_ms_per_audio_second"].items())
+        print(f"{key:>28}: {stats['realtime_speed']:8.0f}x realtime  "
+              f"decoded {stats['chunks_decoded']}/{stats['chunks_seen']} chunks  "
+              f"{stats['decoder_calls']:6d} decoder calls  CPU ms/s: {cpu}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+def legacy_extract_intensity(text, word_to_num):
+    # word2number based parser used before CommandParser
+    match = re.search(r"\b(\d{1,3})\b", text)
+    if match:
+        return int(match.group(1))
+
+    number_keywords = set(NUMBER_UNITS + NUMBER_TENS + ["hundred", "and"])
+    number_words = []
+    for word in text.lower().split():
+        if word in number_keywords:
+            number_words.append(word)
+        elif number_words:
+            try:
+                return int(word_to_num(' '.join(number_words)))
+            except ValueError:
+                number_words = []
+    if number_words:
+        try:
+            return int(word_to_num(' '.join(number_words)))
+        except ValueError:
+            pass
+    return None
+
+
+def time_calls(func, texts, repeat):
+    # Microseconds per call, best of repeat runs
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            func(text)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(texts) * 1e6
+
+
+def bench_parse(args):
+    # CommandParser against the legacy word2number parser on generated phrases
+    parser = CommandParser(args.wake_word, args.names)
+    phrases = build_phrases(args.wake_word, args.names, args.count)
+    texts = [text for text, _ in phrases]
+
+    # Every generated field must come back exactly, chatter must not parse
+    failures = []
+    for text, expected in phrases:
+        command = parser.parse(text)
+        if expected is None:
+            ok = command is None
+        else:
+            ok = command is not None and tuple(command) == expected
+        if not ok:
+            failures.append((text, expected, command))
+
+    report = {
+        "phrases": len(phrases),
+        "parser_failures": len(failures),
+        "parser_us_per_call": time_calls(parser.parse, texts, args.repeat)
+    }
+
+    try:
+        from word2number import w2n
+    except ImportError:
+        w2n = None
+        print("word2number not installed, skipping legacy parser")
+
+    if w2n is not None:
+        def legacy(text):
+            # Old engine flow, wake word substring check then intensity
+            if args.wake_word not in text:
+                return None
+            return legacy_extract_intensity(text, w2n.word_to_num)
+
+        report["legacy_intensity_errors"] = sum(
+            legacy(text) != (expected[0] if expected else None) for text, expected in phrases)
+        report["legacy_us_per_call"] = time_calls(legacy, texts, args.repeat)
+
+    print(f"parser: {report['parser_us_per_call']:6.2f} us/call  "
+          f"failures {report['parser_failures']}/{report['phrases']}")
+    for text, expected, command in failures[:10]:
+        print(f"  {text!r}: expected {expected}, got {command}")
+    if w2n is not None:
+        print(f"legacy: {report['legacy_us_per_call']:6.2f} us/call  "
+              f"intensity errors {report['legacy_intensity_errors']}/{report['phrases']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+    return 1 if failures else 0
+
+
+# Child process for bench_startup: build the app, draw the first frame and
+# report how long each step took since interpreter start
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import voice_shock_control
+imported = time.perf_counter()
+app = voice_shock_control.VoiceShockApp()
+built = time.perf_counter()
+app.root.update()
+drawn = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "init_ms": (built - imported) * 1000,
+                  "first_frame_ms": (drawn - started) * 1000}), flush=True)
+app.dispatcher.stop()
+app.log_listener.stop()
+app.root.destroy()
+"""
+
+
+def import_times(root):
+    # -X importtime for voice_shock_control, total and its direct imports
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import voice_shock_control"],
+                            cwd=root, capture_output=True, text=True)
+    total = None
+    direct = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        depth = len(match.group(3)) // 2
+        if depth == 0 and match.group(4) == "voice_shock_control":
+            total = cumulative_ms
+        elif depth == 1:
+            direct[match.group(4)] = cumulative_ms
+    if total is None:
+        raise RuntimeError(f"voice_shock_control failed to import:\n{result.stderr[-2000:]}")
+    return total, direct
+
+
+def bench_startup(args):
+    # Import time and time to first frame of the GUI, median of several runs
+    root = os.path.dirname(os.path.abspath(__file__))
+    imports = [import_times(root) for _ in range(args.runs)]
+    import_ms = float(np.median([total for total, _ in imports]))
+    slowest = sorted(imports[-1][1].items(), key=lambda item: -item[1])[:args.top]
+
+    frames = []
+    if not args.no_gui:
+        # Run from an empty directory so no config.json or log file is touched
+        with tempfile.TemporaryDirectory() as workdir:
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                process = subprocess.Popen([sys.executable, "-c", STARTUP_PROBE, root],
+                                           cwd=workdir, stdout=subprocess.PIPE, text=True)
+                line = process.stdout.readline()
+                wall = time.perf_counter() - t0
+                process.wait()
+                if not line:
+                    raise RuntimeError("startup probe did not draw a frame")
+                timings = json.loads(line)
+                timings["process_to_frame_ms"] = wall * 1000
+                frames.append(timings)
+
+    report = {"import_ms": import_ms, "slowest_imports_ms": dict(slowest)}
+    if frames:
+        report["gui"] = {key: float(np.median([timing[key] for timing in frames])) for key in frames[0]}
+
+    print(f"import voice_shock_control: {import_ms:.0f} ms")
+    for name, ms in slowest:
+        print(f"  {name:<24} {ms:7.1f} ms")
+    if frames:
+        gui = report["gui"]
+        print(f"first frame: {gui['first_frame_ms']:.0f} ms after interpreter start "
+              f"(import {gui['import_ms']:.0f} ms, app init {gui['init_ms']:.0f} ms), "
+              f"{gui['process_to_frame_ms']:.0f} ms including process start")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.budget_ms and import_ms > args.budget_ms:
+        print(f"import time over budget ({import_ms:.0f} > {args.budget_ms} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PupShock Voice benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    grammar_parser = subparsers.add_parser("grammar",
+                                           help="open vocabulary vs command grammar recognizer")
+    grammar_parser.add_argument("--model", required=True, help="path to an extracted Vosk model")
+    grammar_parser.add_argument("--manifest", required=True, help="fixture manifest JSON")
+    grammar_parser.add_argument("--wake-word", default="shock")
+    grammar_parser.add_argument("--json", help="write results to this JSON file")
+    grammar_parser.set_defaults(func=bench_grammar)
+
+    resample_parser = subparsers.add_parser("resample",
+                                            help="legacy np.interp vs streaming resampler")
+    resample_parser.add_argument("--rates", type=int, nargs="+", default=[44100, 48000])
+    resample_parser.add_argument("--chunk-size", type=int, default=512)
+    resample_parser.add_argument("--seconds", type=int, default=10)
+    resample_parser.add_argument("--freq", type=float, default=1000.0,
+                                 help="test tone frequency in Hz")
+    resample_parser.add_argument("--json", help="write results to this JSON file")
+    resample_parser.set_defaults(func=bench_resample)
+
+    pipeline_parser = subparsers.add_parser("pipeline",
+                                            help="end-to-end engine run over a noisy multi-rate corpus")
+    pipeline_parser.add_argument("--manifest", required=True, help="fixture manifest JSON")
+    pipeline_parser.add_argument("--model", help="path to an extracted Vosk model, overrides --model-size")
+    pipeline_parser.add_argument("--model-size", choices=["small", "large"],
+                                 help="downloaded model to use instead of the configured one")
+    pipeline_parser.add_argument("--config", default="config.json",
+                                 help="config file for pipeline settings (default: config.json)")
+    pipeline_parser.add_argument("--chunk-size", type=int, help="override chunk_size")
+    pipeline_parser.add_argument("--rates", type=int, nargs="+", default=[16000, 44100, 48000])
+    pipeline_parser.add_argument("--snr", nargs="+", default=["clean", "20", "10"],
+                                 help="speech to noise ratios in dB, or clean")
+    pipeline_parser.add_argument("--noise", help="WAV file to use as background noise instead of pink noise")
+    pipeline_parser.add_argument("--save-corpus", metavar="DIR", help="write the generated corpus as WAV files")
+    pipeline_parser.add_argument("--json", help="write results to this JSON file")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    parse_parser = subparsers.add_parser("parse",
+                                         help="command parser vs legacy word2number parser")
+    parse_parser.add_argument("--wake-word", default="shock")
+    parse_parser.add_argument("--names", nargs="*", default=["left", "right"],
+                              help="shocker names to address in generated commands")
+    parse_parser.add_argument("--count", type=int, default=5000, help="number of generated phrases")
+    parse_parser.add_argument("--repeat", type=int, default=5)
+    parse_parser.add_argument("--json", help="write results to this JSON file")
+    parse_parser.set_defaults(func=bench_parse)
+
+    decode_parser = subparsers.add_parser("decode",
+                                          help="engine throughput per chunk_size and decode_block_ms")
+    decode_parser.add_argument("--model", help="path to an extracted Vosk model, a null decoder if omitted")
+    decode_parser.add_argument("--manifest", help="fixture manifest JSON, pink noise if omitted")
+    decode_parser.add_argument("--config", default="config.json",
+                               help="config file for pipeline settings (default: config.json)")
+    decode_parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    decode_parser.add_argument("--block-ms", type=int, nargs="+", default=[0, 100],
+                               help="decode_block_ms values, 0 decodes every mixer block")
+    decode_parser.add_argument("--vad", nargs="+", choices=["off", "on"], default=["off"],
+                               help="speech gate settings to run, e.g. --vad off on")
+    decode_parser.add_argument("--speech-duty", type=float, default=1.0,
+                               help="fraction of the generated audio that is loud, the rest is a quiet room")
+    decode_parser.add_argument("--rate", type=int, default=48000, help="capture rate of the generated audio")
+    decode_parser.add_argument("--seconds", type=int, default=30, help="length of the generated audio")
+    decode_parser.add_argument("--json", help="write results to this JSON file")
+    decode_parser.set_defaults(func=bench_decode)
+
+    startup_parser = subparsers.add_parser("startup",
+                                           help="import time and GUI time to first frame")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    startup_parser.add_argument("--budget-ms", type=float,
+                                help="fail if importing voice_shock_control takes longer than this")
+    startup_parser.add_argument("--no-gui", action="store_true", help="only measure import time")
+    startup_parser.add_argument("--json", help="write results to this JSON file")
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    SetLogLevel(-1)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import random
+
+from voice_shock_control import NUMBER_TENS, NUMBER_UNITS
+
+# Generated command phrases with known fields, shared by the parser tests and
+# "benchmark.py parse"
+
+
+def spoken_number(value, rng):
+    # One way a recognizer could transcribe a value from 0 to 100
+    if rng.random() < 0.2:
+        return str(value)
+    if value == 100:
+        return rng.choice(["a hundred", "one hundred", "hundred"])
+    if value < 20:
+        return NUMBER_UNITS[value]
+    tens, unit = divmod(value, 10)
+    return NUMBER_TENS[tens - 2] if unit == 0 else f"{NUMBER_TENS[tens - 2]} {NUMBER_UNITS[unit]}"
+
+
+def build_phrases(wake_word, names, count, seed=1234):
+    # Random commands with known fields, and chatter without the wake word
+    rng = random.Random(seed)
+    chatter = ["okay", "so", "i", "think", "maybe", "about", "two", "ten", "forty", "now", "please"]
+    modes = {"": "Shock", "vibrate": "Vibrate", "buzz": "Vibrate", "beep": "Sound", "zap": "Shock"}
+    phrases = []
+    for index in range(count):
+        value = index % 101
+        words = rng.sample(chatter, rng.randint(0, 3))
+        if index % 10 == 9:
+            # No wake word, must not parse as a command
+            words += [spoken_number(value, rng)]
+            phrases.append((" ".join(words), None))
+            continue
+
+        words.append(wake_word)
+        targets = None
+        if names and rng.random() < 0.5:
+            targets = [rng.choice(names)]
+            words.append(targets[0])
+        mode_word = rng.choice(list(modes))
+        if mode_word:
+            words.append(mode_word)
+        words.append(spoken_number(value, rng))
+        if rng.random() < 0.3:
+            words.append("percent")
+        duration_ms = None
+        if rng.random() < 0.3:
+            seconds = rng.randint(1, 5)
+            words += ["for", spoken_number(seconds, rng), "second" if seconds == 1 else "seconds"]
+            duration_ms = seconds * 1000
+        phrases.append((" ".join(words), (value, targets, duration_ms, modes[mode_word])))
+    return phrases
@@ -0,0 +1,37 @@
+import pytest
+
+from phrases import build_phrases
+from voice_shock_control import CommandParser, ParsedCommand
+
+SEEDS = range(5)
+NAME_SETS = [[], ["rex", "fido", "luna"]]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("names", NAME_SETS)
+@pytest.mark.parametrize("wake_word", ["shock", "pup"])
+def test_generated_phrases_round_trip(wake_word, names, seed):
+    # Every generated command parses back to the fields it was built from
+    parser = CommandParser(wake_word, names)
+    for text, expected in build_phrases(wake_word, names, 1000, seed=seed):
+        command = parser.parse(text)
+        if expected is None:
+            assert command is None, text
+        else:
+            assert command == ParsedCommand(*expected), text
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_no_command_without_wake_word(seed):
+    # Removing the wake word from a command leaves nothing to parse
+    parser = CommandParser("pup", ["rex"])
+    for text, expected in build_phrases("pup", ["rex"], 500, seed=seed):
+        words = [word for word in text.split() if word != "pup"]
+        assert parser.parse(" ".join(words)) is None, text
+
+
+def test_only_text_after_wake_word_counts():
+    parser = CommandParser("shock", [])
+
+    assert parser.parse("forty people said shock ten") == ParsedCommand(10)
+    assert parser.parse("shock") == ParsedCommand(None)
@@ -0,0 +1,60 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from voice_shock_control import DeviceRegistry
+
+
+@pytest.fixture
+def fake_sd(monkeypatch):
+    # sounddevice double that counts PortAudio restarts
+    sd = types.SimpleNamespace(restarts=0)
+    sd._terminate = lambda: setattr(sd, "restarts", sd.restarts + 1)
+    sd._initialize = lambda: None
+    sd.query_hostapis = lambda: [{"name": "MME"}]
+    sd.query_devices = lambda: [
+        {"name": "Mic", "hostapi": 0, "max_input_channels": 1, "max_output_channels": 0,
+         "default_samplerate": 48000.0},
+        {"name": "Mic", "hostapi": 0, "max_input_channels": 1, "max_output_channels": 0,
+         "default_samplerate": 44100.0}
+    ]
+    monkeypatch.setitem(sys.modules, "sounddevice", sd)
+    return sd
+
+
+def test_duplicate_devices_get_stable_ids(fake_sd):
+    registry = DeviceRegistry(log=lambda *args, **kwargs: None)
+
+    assert [device["id"] for device in registry.input_devices()] == ["Mic|MME", "Mic|MME#2"]
+    assert registry.resolve("Mic|MME#2")["index"] == 1
+
+
+def test_rescan_does_not_restart_portaudio_while_in_use(fake_sd):
+    registry = DeviceRegistry(log=lambda *args, **kwargs: None)
+    registry.refresh(reinitialize=True)
+    assert fake_sd.restarts == 1
+
+    registry.in_use = True
+    registry.refresh(reinitialize=True)
+
+    assert fake_sd.restarts == 1
+    assert registry.resolve("Mic|MME") is not None
+
+
+def test_rescan_waits_for_streams_being_opened(fake_sd):
+    # A rescan started while streams are opened runs after, and leaves them alone
+    registry = DeviceRegistry(log=lambda *args, **kwargs: None)
+    registry.refresh()
+
+    with registry.lock:
+        registry.in_use = True
+        registry.resolve("Mic|MME")
+        rescan = threading.Thread(target=registry.refresh, args=(True,))
+        rescan.start()
+        rescan.join(0.2)
+        assert rescan.is_alive()
+    rescan.join(5)
+
+    assert fake_sd.restarts == 0
@@ -0,0 +1,202 @@
+import http.server
+import json
+import socket
+import threading
+import time
+
+from voice_shock_control import DEFAULT_CONFIG, ParsedCommand, ShockController, ShockDispatcher
+
+
+def make_config(base_url, **overrides):
+    config = dict(DEFAULT_CONFIG, api_base_url=base_url, api_token="token", control_id="shocker-1")
+    config.update(overrides)
+    return config
+
+
+def make_payload(intensity=10):
+    return {"shocks": [{"id": "shocker-1", "type": "Shock", "intensity": intensity, "duration": 1000}],
+            "customName": "PupShockVoice"}
+
+
+class ControlServer:
+    # Records control POSTs, optionally holding each one until released
+    def __init__(self, hold=False):
+        self.requests = []
+        self.arrived = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append((self.path, self.headers.get("OpenShockToken"), body))
+                server.arrived.set()
+                server.release.wait(5)
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def quiet_log(*args, **kwargs):
+    pass
+
+
+def closed_port():
+    # A local port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_round_trip(http_server):
+    # A submitted payload reaches the API and reports HTTP 200 back
+    server = ControlServer()
+    dispatcher = ShockDispatcher(make_config(http_server(server.handler())), log=quiet_log)
+    sent, done = [], []
+    try:
+        assert dispatcher.submit(make_payload(), on_sent=sent.append, on_done=done.append)
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert [(path, token) for path, token, _ in server.requests] == [("/2/shockers/control", "token")]
+    assert server.requests[0][2] == make_payload()
+    assert len(sent) == 1
+    assert done[0].ok and done[0].status == 200 and done[0].via == "HTTP"
+
+
+def test_full_queue_drops_command(http_server):
+    # With one request in flight and one queued, the next submit is refused
+    server = ControlServer(hold=True)
+    dispatcher = ShockDispatcher(make_config(http_server(server.handler())), log=quiet_log, max_pending=1)
+    try:
+        assert dispatcher.submit(make_payload(10))
+        assert server.arrived.wait(5)
+        assert dispatcher.submit(make_payload(20))
+        assert not dispatcher.submit(make_payload(30))
+        server.release.set()
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert [body["shocks"][0]["intensity"] for _, _, body in server.requests] == [10, 20]
+
+
+def test_queued_command_expires_at_deadline(http_server):
+    # A command stuck behind a slow request is dropped, not sent late
+    server = ControlServer(hold=True)
+    dispatcher = ShockDispatcher(make_config(http_server(server.handler())), log=quiet_log)
+    done = []
+    try:
+        assert dispatcher.submit(make_payload(10))
+        assert server.arrived.wait(5)
+        assert dispatcher.submit(make_payload(20), on_done=done.append, deadline=time.monotonic() + 0.05)
+        time.sleep(0.2)
+        server.release.set()
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert len(server.requests) == 1
+    assert not done[0].ok and done[0].status == "expired"
+
+
+def local_config(base_url, shockers):
+    # Local hub backend pointing at a port nothing listens on
+    return make_config(base_url, control_backend="local", control_id="", shockers=shockers,
+                       local_host="127.0.0.1", local_port=closed_port())
+
+
+def test_local_without_cloud_ids_has_no_rest_fallback(http_server):
+    # RF only shockers are never posted to the cloud API
+    server = ControlServer()
+    config = local_config(http_server(server.handler()), [{"name": "rex", "rf_id": 1234}])
+    dispatcher = ShockDispatcher(config, log=quiet_log)
+    payload = {"shocks": [{"id": "local:caixianlin:1234", "type": "Shock", "intensity": 10, "duration": 1000}],
+               "customName": "PupShockVoice"}
+    try:
+        dispatcher.submit(payload)
+        dispatcher.flush()
+        assert [backend.name for backend in dispatcher.backends] == ["local"]
+    finally:
+        dispatcher.stop()
+
+    assert not server.requests
+
+
+def test_rest_fallback_only_sends_cloud_shockers(http_server):
+    # With the hub down, only the shocker with a cloud id goes out over HTTP
+    server = ControlServer()
+    config = local_config(http_server(server.handler()), [{"name": "rex", "id": "cloud-1", "rf_id": 1},
+                                                          {"name": "fido", "rf_id": 2}])
+    dispatcher = ShockDispatcher(config, log=quiet_log)
+    payload = {"shocks": [{"id": "cloud-1", "type": "Shock", "intensity": 10, "duration": 1000},
+                          {"id": "local:caixianlin:2", "type": "Shock", "intensity": 10, "duration": 1000}],
+               "customName": "PupShockVoice"}
+    done = []
+    try:
+        dispatcher.submit(payload, on_done=done.append)
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert [shock["id"] for shock in server.requests[0][2]["shocks"]] == ["cloud-1"]
+    assert done[0].ok and done[0].via == "HTTP"
+
+
+def test_failed_send_releases_cooldown():
+    # A POST to a closed port must not leave the cooldown running
+    config = make_config(f"http://127.0.0.1:{closed_port()}", cooldown_seconds=10)
+    dispatcher = ShockDispatcher(config, log=quiet_log)
+    controller = ShockController(config, dispatcher, log=quiet_log)
+    try:
+        assert controller.scheduler.submit(ParsedCommand(10))
+        dispatcher.flush()
+        assert controller.scheduler.submit(ParsedCommand(20))
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+
+def test_no_backend_available_reports_failure():
+    # A command no backend takes still reports back through on_done
+    config = make_config("http://127.0.0.1:1", control_backend="live", control_fallback_rest=False)
+    dispatcher = ShockDispatcher(config, log=quiet_log)
+    done = []
+    try:
+        dispatcher.submit(make_payload(), on_done=done.append)
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert not done[0].ok and done[0].via == "dispatcher"
+
+
+def test_round_trip_timing_per_connection(http_server):
+    # The first request reports its connection setup, the second reuses it
+    server = ControlServer()
+    dispatcher = ShockDispatcher(make_config(http_server(server.handler())), log=quiet_log)
+    done = []
+    try:
+        dispatcher.submit(make_payload(10), on_done=done.append)
+        dispatcher.flush()
+        dispatcher.submit(make_payload(20), on_done=done.append)
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert done[0].detail.startswith("new connection, TCP connect incl. DNS ")
+    assert "request to headers" in done[0].detail
+    assert done[1].detail.startswith("reused connection, request to headers ")
@@ -0,0 +1,200 @@
+import json
+import wave
+
+import numpy as np
+import pytest
+
+from voice_shock_control import DEFAULT_CONFIG, RecognitionEngine, read_replay_audio
+
+RATE = 16000
+
+
+class ScriptedRecognizer:
+    # KaldiRecognizer stand-in that "recognizes" each burst of sound as the
+    # next scripted phrase once 200 ms of silence follow it
+    def __init__(self, phrases, block=320, end_silence=3200):
+        self.phrases = list(phrases)
+        self.block = block
+        self.end_silence = end_silence
+        self.samples = 0
+        self.in_speech = False
+        self.silence = 0
+        self.pending = ""
+        self.resets = 0
+
+    def AcceptWaveform(self, data):
+        audio = np.frombuffer(bytes(data), dtype=np.int16)
+        self.samples += len(audio)
+        final = False
+        for start in range(0, len(audio), self.block):
+            part = audio[start:start + self.block]
+            if np.abs(part).max() > 1000:
+                self.in_speech = True
+                self.silence = 0
+            elif self.in_speech:
+                self.silence += len(part)
+                if self.silence >= self.end_silence:
+                    self.in_speech = False
+                    self.pending = self.phrases.pop(0)
+                    final = True
+        return final
+
+    def Result(self):
+        text, self.pending = self.pending, ""
+        return json.dumps({"text": text})
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self):
+        return self.Result()
+
+    def Reset(self):
+        self.resets += 1
+
+
+class ScriptedEngine(RecognitionEngine):
+    def __init__(self, config, recognizer, **kwargs):
+        super().__init__(config, **kwargs)
+        self.scripted = recognizer
+
+    def create_recognizer(self, announce=False):
+        self.recognizer_dirty = False
+        return self.scripted
+
+
+def write_commands_wav(path):
+    # Two one second tones 300 ms apart, padded to whole mixer blocks
+    def tone(seconds):
+        t = np.arange(int(RATE * seconds)) / RATE
+        return 0.3 * np.sin(2 * np.pi * 440 * t)
+
+    def silence(seconds):
+        return np.zeros(int(RATE * seconds))
+
+    audio = np.concatenate([silence(0.5), tone(1.0), silence(0.3), tone(1.0), silence(1.0)])
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def run_engine(wav_path, **overrides):
+    # Stream a WAV file through the engine, returns (engine, recognizer, fired, samples fed)
+    config = dict(DEFAULT_CONFIG, **overrides)
+    recognizer = ScriptedRecognizer(["shock fifty", "shock twenty"])
+    fired = []
+    engine = ScriptedEngine(config, recognizer, log=lambda *args, **kwargs: None,
+                            on_command=lambda command, trigger, speech_time: fired.append(command))
+    engine.start_session(None, None)
+    engine.add_source("replay", RATE, primary=True)
+
+    samples, rate = read_replay_audio(str(wav_path))
+    block_size = config["chunk_size"]
+    for start in range(0, len(samples), block_size):
+        block = samples[start:start + block_size]
+        engine.feed("replay", block, (start + len(block)) / rate)
+    engine.flush()
+    return engine, recognizer, fired, len(samples)
+
+
+@pytest.mark.parametrize("decode_block_ms", [0, 100])
+def test_back_to_back_commands_without_dropped_audio(tmp_path, decode_block_ms):
+    # Both commands fire and every sample fed reaches the decoder
+    wav_path = tmp_path / "commands.wav"
+    write_commands_wav(wav_path)
+
+    engine, recognizer, fired, fed = run_engine(wav_path, vad_enabled=False, decode_block_ms=decode_block_ms)
+
+    assert [command.intensity for command in fired] == [50, 20]
+    assert recognizer.samples == fed
+    assert recognizer.resets >= 2
+    assert engine.accept_calls >= fed // engine.pcm_block
+
+
+def test_back_to_back_commands_with_speech_gate(tmp_path):
+    # The 300 ms gap is inside the gate hangover, the second command is not clipped
+    wav_path = tmp_path / "commands.wav"
+    write_commands_wav(wav_path)
+
+    engine, recognizer, fired, fed = run_engine(wav_path, vad_enabled=True)
+
+    assert [command.intensity for command in fired] == [50, 20]
+    assert not recognizer.phrases
+
+
+class RecordingRecognizer(ScriptedRecognizer):
+    # Keeps every object handed to AcceptWaveform
+    def __init__(self):
+        super().__init__([])
+        self.received = []
+
+    def AcceptWaveform(self, data):
+        self.received.append(data)
+        return super().AcceptWaveform(data)
+
+
+def feed_tone(engine, seconds):
+    t = np.arange(int(RATE * seconds)) / RATE
+    audio = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    for start in range(0, len(audio), 512):
+        engine.feed("replay", audio[start:start + 512], start / RATE)
+
+
+def test_full_batches_are_views_of_the_pcm_buffer():
+    # A full batch is the preallocated buffer itself, only the partial batch
+    # flushed at the end is a shorter view, and no bytes object is built
+    recognizer = RecordingRecognizer()
+    engine = ScriptedEngine(dict(DEFAULT_CONFIG, vad_enabled=False, decode_block_ms=100), recognizer,
+                            log=lambda *args, **kwargs: None)
+    engine.start_session(None, None)
+    engine.add_source("replay", RATE, primary=True)
+
+    feed_tone(engine, 0.35)
+    engine.flush()
+
+    full, partial = recognizer.received[:-1], recognizer.received[-1]
+    assert len(full) == 3
+    assert all(data is engine.pcm_batch for data in full)
+    assert engine.pcm_batch.obj is engine.pcm_bytes
+    assert isinstance(partial, memoryview) and partial.obj is engine.pcm_bytes
+    assert len(partial) == 2 * (int(0.35 * RATE) // 320 * 320 - 3 * 1600)
+    assert not any(isinstance(data, bytes) for data in recognizer.received)
+
+
+def test_vosk_recognizer_gets_a_cffi_view_of_the_pcm_buffer(monkeypatch):
+    # Vosk's char pointer argument rejects a bytearray, the engine hands it
+    # a cffi view of the same memory instead
+    vosk = pytest.importorskip("vosk")
+    received = []
+
+    class KaldiRecognizer:
+        def __init__(self, model, rate, grammar=None):
+            pass
+
+        def SetWords(self, words):
+            pass
+
+        def AcceptWaveform(self, data):
+            received.append(data)
+            return False
+
+        def FinalResult(self):
+            return json.dumps({"text": ""})
+
+        def Reset(self):
+            pass
+
+    monkeypatch.setattr(vosk, "KaldiRecognizer", KaldiRecognizer)
+    engine = RecognitionEngine(dict(DEFAULT_CONFIG, vad_enabled=False, decode_block_ms=100),
+                               log=lambda *args, **kwargs: None)
+    engine.start_session(None, None)
+    engine.add_source("replay", RATE, primary=True)
+
+    feed_tone(engine, 0.1)
+
+    assert received == [engine.pcm_batch]
+    assert vosk._ffi.typeof(engine.pcm_batch) is vosk._ffi.typeof("char[]")
+    engine.pcm_bytes[:2] = b"\x01\x02"
+    assert vosk._ffi.buffer(engine.pcm_batch)[:2] == b"\x01\x02"
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import http.server
+import json
+import struct
+import threading
+import time
+
+from voice_shock_control import DEFAULT_CONFIG, LiveChannel, ShockDispatcher
+
+RECORD_SEPARATOR = "\x1e"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class HubStub:
+    # Minimal SignalR user hub: negotiate over HTTP, then a JSON protocol
+    # WebSocket that completes every invocation. With close_after set the
+    # connection is closed with a close frame after that many invocations.
+    def __init__(self, close_after=None, negotiate=True):
+        self.close_after = close_after
+        self.negotiate = negotiate
+        self.connections = 0
+        self.invocations = []
+        self.control_posts = []
+        self.lock = threading.Lock()
+
+    def handler(self):
+        hub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.startswith("/1/hubs/user/negotiate") and hub.negotiate:
+                    self.reply(200, {"connectionToken": "token-1", "negotiateVersion": 1})
+                elif self.path == "/2/shockers/control":
+                    hub.control_posts.append(json.loads(body))
+                    self.reply(200, {})
+                else:
+                    self.reply(404, {})
+
+            def do_GET(self):
+                if not self.path.startswith("/1/hubs/user?id=token-1"):
+                    self.reply(404, {})
+                    return
+                accept = base64.b64encode(hashlib.sha1(
+                    (self.headers["Sec-WebSocket-Key"] + WS_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                with hub.lock:
+                    hub.connections += 1
+                hub.serve(self.rfile, self.wfile)
+                self.close_connection = True
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve(self, rfile, wfile):
+        # Handshake, then complete invocations until the client goes away
+        handled = 0
+        while True:
+            frame = read_frame(rfile)
+            if frame is None:
+                return
+            opcode, data = frame
+            if opcode == 0x8:
+                return
+            for record in data.decode().split(RECORD_SEPARATOR):
+                if not record:
+                    continue
+                message = json.loads(record)
+                if message.get("protocol") == "json":
+                    write_frame(wfile, 0x1, ("{}" + RECORD_SEPARATOR).encode())
+                elif message.get("type") == 1:
+                    with self.lock:
+                        self.invocations.append(message)
+                    completion = {"type": 3, "invocationId": message["invocationId"], "result": None}
+                    write_frame(wfile, 0x1, (json.dumps(completion) + RECORD_SEPARATOR).encode())
+                    handled += 1
+                    if self.close_after is not None and handled >= self.close_after:
+                        self.close_after = None
+                        write_frame(wfile, 0x8, struct.pack("!H", 1000))
+                        return
+
+
+def read_frame(rfile):
+    # One client frame, unmasked, None when the connection closed
+    header = rfile.read(2)
+    if len(header) < 2:
+        return None
+    opcode = header[0] & 0x0F
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", rfile.read(8))[0]
+    mask = rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+    data = rfile.read(length)
+    return opcode, bytes(byte ^ mask[i % 4] for i, byte in enumerate(data))
+
+
+def write_frame(wfile, opcode, data):
+    if len(data) < 126:
+        header = struct.pack("!BB", 0x80 | opcode, len(data))
+    else:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, len(data))
+    wfile.write(header + data)
+    wfile.flush()
+
+
+def make_config(base_url, **overrides):
+    return dict(DEFAULT_CONFIG, api_base_url=base_url, api_token="token", control_id="shocker-1", **overrides)
+
+
+def quiet_log(*args, **kwargs):
+    pass
+
+
+def invoke_and_wait(channel, arguments):
+    # Invoke ControlV2 and wait for its completion, returns the error or "timeout"
+    done = threading.Event()
+    errors = []
+
+    def completed(error):
+        errors.append(error)
+        done.set()
+
+    assert channel.invoke("ControlV2", arguments, completed)
+    return errors[0] if done.wait(5) else "timeout"
+
+
+def test_invocation_completes(http_server):
+    # Negotiate, handshake and a completed ControlV2 invocation
+    hub = HubStub()
+    channel = LiveChannel(make_config(http_server(hub.handler())), log=quiet_log)
+    try:
+        assert channel.start()
+        assert channel.wait_connected(5)
+        assert invoke_and_wait(channel, [[{"id": "shocker-1"}], "PupShockVoice"]) is None
+    finally:
+        channel.stop()
+
+    assert hub.invocations[0]["target"] == "ControlV2"
+    assert hub.invocations[0]["arguments"] == [[{"id": "shocker-1"}], "PupShockVoice"]
+
+
+def test_reconnects_after_close_frame(http_server):
+    # A close frame from the hub drops the channel, it comes back on its own
+    hub = HubStub(close_after=1)
+    channel = LiveChannel(make_config(http_server(hub.handler())), log=quiet_log)
+    try:
+        channel.start()
+        assert channel.wait_connected(5)
+        assert invoke_and_wait(channel, ["first"]) is None
+
+        deadline = time.monotonic() + 10
+        while hub.connections < 2 or not channel.connected:
+            assert time.monotonic() < deadline, "channel did not reconnect"
+            time.sleep(0.05)
+        assert invoke_and_wait(channel, ["second"]) is None
+    finally:
+        channel.stop()
+
+    assert [message["arguments"] for message in hub.invocations] == [["first"], ["second"]]
+
+
+def test_falls_back_to_rest_when_channel_is_down(http_server):
+    # Negotiate fails, so the command goes out over the REST API instead
+    hub = HubStub(negotiate=False)
+    dispatcher = ShockDispatcher(make_config(http_server(hub.handler()), control_backend="live"), log=quiet_log)
+    payload = {"shocks": [{"id": "shocker-1", "type": "Shock", "intensity": 10, "duration": 1000}],
+               "customName": "PupShockVoice"}
+    done = []
+    try:
+        assert dispatcher.submit(payload, on_done=done.append)
+        dispatcher.flush()
+    finally:
+        dispatcher.stop()
+
+    assert hub.control_posts == [payload]
+    assert not hub.invocations
+    assert done[0].ok and done[0].via == "HTTP"
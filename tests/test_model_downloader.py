@@ -0,0 +1,181 @@
+import hashlib
+import http.server
+import io
+import os
+import zipfile
+
+import pytest
+
+import voice_shock_control
+from voice_shock_control import ModelDownloader
+
+MODEL_FILES = {
+    "vosk-model-test/am/final.mdl": os.urandom(300 * 1024),
+    "vosk-model-test/conf/model.conf": b"--sample-frequency=16000\n"
+}
+
+
+def build_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, data in files.items():
+            zip_file.writestr(name, data)
+    return buffer.getvalue()
+
+
+MODEL_ZIP = build_zip(MODEL_FILES)
+
+
+class ModelServer:
+    # Serves one zip. cut_at ends the first response early, honor_range=False
+    # answers every request with the whole file
+    def __init__(self, data=MODEL_ZIP, cut_at=None, honor_range=True):
+        self.data = data
+        self.cut_at = cut_at
+        self.honor_range = honor_range
+        self.ranges = []
+
+    def handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                data = server.data
+                requested = self.headers.get("Range")
+                server.ranges.append(requested)
+                if requested and server.honor_range:
+                    offset = int(requested[len("bytes="):].rstrip("-"))
+                    if offset >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}")
+                    body = data[offset:]
+                else:
+                    self.send_response(200)
+                    body = data
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                if server.cut_at is not None:
+                    # Drop the connection part way through the body
+                    self.wfile.write(body[:server.cut_at])
+                    server.cut_at = None
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    # No retry backoff in tests
+    monkeypatch.setattr(voice_shock_control.time, "sleep", lambda seconds: None)
+    return ModelDownloader(log=lambda *args, **kwargs: None)
+
+
+def model_info(url, sha256=None):
+    info = {"name": "vosk-model-test", "url": url + "/model.zip", "size": "1 MB"}
+    if sha256:
+        info["sha256"] = sha256
+    return info
+
+
+def assert_installed(model_dir):
+    # The zip's top level folder is now model_dir, nothing else is left behind
+    for name, data in MODEL_FILES.items():
+        with open(os.path.join(model_dir, name.partition("/")[2]), "rb") as f:
+            assert f.read() == data
+    assert os.listdir(os.path.dirname(model_dir)) == [os.path.basename(model_dir)]
+
+
+def test_resumes_after_connection_cut(http_server, downloader, tmp_path):
+    server = ModelServer(cut_at=100 * 1024)
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+
+    downloader.install(model_info(http_server(server.handler()),
+                                  hashlib.sha256(MODEL_ZIP).hexdigest()), model_dir)
+
+    assert server.ranges[0] is None
+    assert server.ranges[1] is not None and int(server.ranges[1][len("bytes="):-1]) > 0
+    assert_installed(model_dir)
+
+
+def test_restarts_when_server_ignores_range(http_server, downloader, tmp_path):
+    server = ModelServer(honor_range=False)
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+    os.makedirs(os.path.dirname(model_dir))
+    with open(model_dir + ".zip.part", "wb") as f:
+        f.write(b"stale bytes from another file")
+
+    downloader.install(model_info(http_server(server.handler())), model_dir)
+
+    assert server.ranges == ["bytes=29-"]
+    assert_installed(model_dir)
+
+
+def test_complete_part_file_gets_416(http_server, downloader, tmp_path):
+    server = ModelServer()
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+    os.makedirs(os.path.dirname(model_dir))
+    with open(model_dir + ".zip.part", "wb") as f:
+        f.write(MODEL_ZIP)
+
+    downloader.install(model_info(http_server(server.handler())), model_dir)
+
+    assert server.ranges == [f"bytes={len(MODEL_ZIP)}-"]
+    assert_installed(model_dir)
+
+
+def test_checksum_mismatch_removes_part_file(http_server, downloader, tmp_path):
+    server = ModelServer()
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+
+    with pytest.raises(ValueError):
+        downloader.install(model_info(http_server(server.handler()), "0" * 64), model_dir)
+
+    assert os.listdir(tmp_path / "models") == []
+
+
+def test_model_is_moved_into_place_in_one_rename(http_server, downloader, tmp_path, monkeypatch):
+    # model_dir only appears through os.replace of a fully extracted folder
+    server = ModelServer()
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+    renames = []
+    real_replace = os.replace
+
+    def replace(source, target):
+        assert not os.path.exists(model_dir)
+        assert os.path.exists(os.path.join(source, "am", "final.mdl"))
+        renames.append((source, target))
+        real_replace(source, target)
+
+    monkeypatch.setattr(os, "replace", replace)
+    downloader.install(model_info(http_server(server.handler())), model_dir)
+
+    assert len(renames) == 1
+    source, target = renames[0]
+    assert target == model_dir
+    assert os.path.basename(os.path.dirname(source)).startswith(".extract-")
+    assert_installed(model_dir)
+
+
+def test_corrupt_member_leaves_nothing_installed(http_server, downloader, tmp_path):
+    # A CRC error during extraction must not leave a half extracted model
+    data = bytearray(MODEL_ZIP)
+    start = data.index(MODEL_FILES["vosk-model-test/am/final.mdl"][:64])
+    data[start + 1000] ^= 0xFF
+    server = ModelServer(data=bytes(data))
+    model_dir = str(tmp_path / "models" / "vosk-model-test")
+
+    with pytest.raises(zipfile.BadZipFile):
+        downloader.install(model_info(http_server(server.handler())), model_dir)
+
+    assert os.listdir(tmp_path / "models") == []
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from voice_shock_control import StreamingResampler
+
+FREQ = 440
+SECONDS = 2
+MIN_SNR_DB = 70
+
+
+def sine(rate, seconds=SECONDS, freq=FREQ):
+    return np.sin(2 * np.pi * freq * np.arange(rate * seconds) / rate).astype(np.float32)
+
+
+def resample_blocks(resampler, audio, block_size):
+    # Feed audio in fixed size blocks, copies since the output buffer is reused
+    return np.concatenate([resampler.process(audio[start:start + block_size]).copy()
+                           for start in range(0, len(audio), block_size)])
+
+
+def snr_db(output, freq=FREQ, skip=200):
+    # SNR against the exact 16kHz sine, skipping the filter warm up at both ends
+    reference = np.sin(2 * np.pi * freq * np.arange(len(output)) / 16000)
+    error = output[skip:-skip] - reference[skip:-skip]
+    return 10 * np.log10(np.mean(reference[skip:-skip] ** 2) / np.mean(error ** 2))
+
+
+@pytest.mark.parametrize("rate", [44100, 48000, 8000])
+@pytest.mark.parametrize("block_size", [441, 512, 1000])
+def test_matches_reference(rate, block_size):
+    resampler = StreamingResampler(rate)
+    audio = sine(rate)
+
+    output = resample_blocks(resampler, audio, block_size)
+
+    # Only the samples still inside the filter window are held back
+    expected = len(audio) * 16000 / rate
+    delay = resampler.half * 16000 / rate + 1
+    assert expected - delay <= len(output) <= expected
+    assert snr_db(output) > MIN_SNR_DB
+
+
+@pytest.mark.parametrize("rate", [44100, 48000, 8000])
+def test_block_split_does_not_change_output(rate):
+    # Phase and history carry across calls, so splitting the input is seamless
+    audio = sine(rate)
+    whole = StreamingResampler(rate).process(audio).copy()
+
+    rng = np.random.default_rng(rate)
+    cuts = np.sort(rng.choice(np.arange(1, len(audio)), size=50, replace=False))
+    resampler = StreamingResampler(rate)
+    split = np.concatenate([resampler.process(part).copy() for part in np.split(audio, cuts)])
+
+    assert len(split) == len(whole)
+    np.testing.assert_allclose(split, whole, atol=1e-6)
+
+
+def test_passthrough_at_16k():
+    audio = sine(16000)
+
+    assert StreamingResampler(16000).process(audio) is audio
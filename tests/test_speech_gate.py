@@ -0,0 +1,44 @@
+import numpy as np
+
+from voice_shock_control import SpeechGate
+
+BLOCK = np.zeros(320, dtype=np.float32)
+BLOCKS_PER_SECOND = 50
+
+
+def run_gate(gate, levels):
+    # Feed RMS levels through the gate, returns blocks passed to the decoder
+    decoded = 0
+    for rms in levels:
+        blocks, _ = gate.process(BLOCK, rms)
+        decoded += len(blocks)
+    return decoded
+
+
+def test_steady_background_closes_gate():
+    # A fan loud enough to open the gate must not keep it open for good
+    gate = SpeechGate()
+    rng = np.random.default_rng(1)
+    levels = 0.05 * (1 + 0.05 * rng.standard_normal(10 * BLOCKS_PER_SECOND))
+
+    run_gate(gate, levels)
+
+    assert not gate.active
+    assert gate.noise_floor > 0.03
+
+
+def test_speech_with_pauses_keeps_floor():
+    # Speech over a quiet room stays decoded and leaves the floor low
+    gate = SpeechGate()
+    levels = [0.1 if (i // 10) % 3 else 0.004 for i in range(10 * BLOCKS_PER_SECOND)]
+
+    decoded = run_gate(gate, levels)
+
+    assert gate.noise_floor < 0.01
+    assert decoded >= len(levels) - 10
+
+
+def test_silence_is_not_decoded():
+    gate = SpeechGate()
+
+    assert run_gate(gate, [0.001] * BLOCKS_PER_SECOND) == 0
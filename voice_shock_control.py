@@ -1,29 +1,50 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sounddevice as sd
-import numpy as np
-import requests
-import queue
 import time
+import queue
+import socket
 import re
 import threading
 import json
+import logging
+import logging.handlers
 import os
-from vosk import Model, KaldiRecognizer
-from pystray import Icon, Menu, MenuItem
-from PIL import Image, ImageDraw
+import math
+import collections
+import importlib
 import sys
+import argparse
+import wave
 import webbrowser
-import zipfile
-import urllib.request
-from word2number import w2n
+import urllib.parse
+
+class LazyModule:
+    # Placeholder for a module used all over this file. The first attribute
+    # access imports it and rebinds the global name to the real module, so
+    # later lookups cost nothing extra.
+    def __init__(self, module_name, alias):
+        self.module_name = module_name
+        self.alias = alias
+        
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.module_name)
+        globals()[self.alias] = module
+        return getattr(module, attr)
+
+# Heavy modules (vosk, sounddevice, requests, pystray, PIL) are imported where
+# first needed so the window shows before they load, numpy on first use
+np = LazyModule("numpy", "np")
 
 # App version
 VERSION = "1.0.0"
 GITHUB_REPO = "LunaFennec/PupShock-Voice"
+OPENSHOCK_API_URL = "https://api.openshock.app"
+
+# Repeated rate limited log messages are suppressed for this many seconds
+LOG_RATE_LIMIT_S = 5.0
 
-# Vosk model configurations
+# Vosk model configurations, an optional "sha256" is checked after download
 VOSK_MODELS = {
     "small": {
         "name": "vosk-model-small-en-us-0.15",
@@ -37,6 +58,2297 @@ VOSK_MODELS = {
     }
 }
 
+def print_log(message, level="INFO", rate_limit=None):
+    # Default log sink for helpers used outside the GUI
+    print(f"[{level}] {message}")
+
+# Settings used for keys missing from config.json
+DEFAULT_CONFIG = {
+    "api_token": "",
+    "control_id": "",
+    "wake_word": "shock",
+    "audio_device": 0,
+    "max_intensity": 40,
+    "duration_ms": 1000,
+    "cooldown_seconds": 10,
+    "chunk_size": 512,
+    "model_size": "small",
+    "loopback_enabled": False,
+    "loopback_device": 0,
+    "loopback_mix_ratio": 0.5,
+    "low_latency_mode": False,
+    "partial_stable_ms": 200,
+    "command_grammar": False,
+    "ring_buffer_ms": 2000,
+    "overflow_policy": "drop_oldest",
+    "max_buffered_ms": 1500,
+    "vad_enabled": True,
+    "vad_preroll_ms": 300,
+    "vad_hangover_ms": 600,
+    "model_cache_size": 2,
+    "model_cache_mb": 4096,
+    "api_base_url": OPENSHOCK_API_URL,
+    "console_max_lines": 2000,
+    "log_file": "",
+    "stats_enabled": False,
+    "stats_file": "",
+    "stats_interval_s": 10,
+    "shockers": [],
+    "control_backend": "rest",
+    "control_fallback_rest": True,
+    "local_host": "",
+    "local_port": 0,
+    "local_serial_port": "",
+    "local_baudrate": 115200,
+    "mock_latency_ms": 0,
+    "coalesce_ms": 0,
+    "coalesce_policy": "max",
+    "command_deadline_ms": 2000,
+    "max_duration_ms": 5000,
+    "audio_device_id": "",
+    "loopback_device_id": "",
+    "device_poll_s": 0,
+    "prefer_16k_capture": True,
+    "decode_block_ms": 100
+}
+
+def load_config_file(config_file):
+    # Defaults overridden by the config file if it exists
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, 'r') as f:
+                config.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading config: {e}")
+    return config
+
+def get_model_path(model_size):
+    # Get path to vosk model for a model size
+    model_info = VOSK_MODELS.get(model_size, VOSK_MODELS["small"])
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", model_info["name"])
+
+# Number words understood by CommandParser
+NUMBER_UNITS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine',
+                'ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen',
+                'seventeen', 'eighteen', 'nineteen']
+NUMBER_TENS = ['twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+
+def build_number_table():
+    # Lookup from one or two words to values 0-100, "fifty five", "a hundred", "55"
+    table = {str(value): value for value in range(101)}
+    for value, word in enumerate(NUMBER_UNITS):
+        table[word] = value
+    for index, tens in enumerate(NUMBER_TENS):
+        value = 20 + 10 * index
+        table[tens] = value
+        for unit in range(1, 10):
+            table[f"{tens} {NUMBER_UNITS[unit]}"] = value + unit
+    table["hundred"] = 100
+    table["a hundred"] = 100
+    table["one hundred"] = 100
+    return table
+
+NUMBER_TABLE = build_number_table()
+# First words of the two word entries
+NUMBER_PREFIXES = frozenset(key.split()[0] for key in NUMBER_TABLE if " " in key)
+
+# Optional words after the wake word, shock type and duration unit in ms
+COMMAND_MODES = {"shock": "Shock", "zap": "Shock", "vibrate": "Vibrate", "buzz": "Vibrate",
+                 "beep": "Sound", "sound": "Sound"}
+DURATION_UNITS = {"second": 1000, "seconds": 1000, "millisecond": 1, "milliseconds": 1}
+
+# Vocabulary of the command grammar besides the wake word and shocker names
+COMMAND_WORDS = (NUMBER_UNITS + NUMBER_TENS + ["a", "hundred", "percent", "for"]
+                 + list(COMMAND_MODES) + list(DURATION_UNITS))
+
+ParsedCommand = collections.namedtuple("ParsedCommand", "intensity targets duration_ms mode",
+                                       defaults=(None, None, "Shock"))
+
+class CommandParser:
+    # Single pass parser for "<wake word> [name] [mode] <intensity> [percent]
+    # [for <n> seconds]". Text is tokenized once with a precompiled pattern and
+    # numbers are looked up in NUMBER_TABLE. Only words after the wake word are
+    # parsed so numbers in chatter before it are ignored. Built per wake word
+    # and shocker names, parse() does no other setup.
+    SEPARATOR_PATTERN = re.compile(r"[^a-z\d ]+")
+        
+    def __init__(self, wake_word, names=()):
+        self.wake = self.tokenize(wake_word)
+        self.names = {}
+        for name in names:
+            words = self.tokenize(name)
+            if words:
+                self.names[" ".join(words)] = name
+        self.name_span = max((len(name.split()) for name in self.names), default=0)
+        
+    def parse(self, text):
+        # ParsedCommand for the words after the wake word, None if it was not said
+        tokens = self.tokenize(text)
+        index = self.find_wake(tokens)
+        if index is None:
+            return None
+        
+        intensity = None
+        duration_ms = None
+        mode = "Shock"
+        targets = []
+        count = len(tokens)
+        while index < count:
+            word = tokens[index]
+            index += 1
+            
+            # Numbers, two word entries first so "fifty five" is not read as 50
+            if word in NUMBER_PREFIXES and index < count:
+                value = NUMBER_TABLE.get(f"{word} {tokens[index]}")
+                if value is not None:
+                    index += 1
+                else:
+                    value = NUMBER_TABLE.get(word)
+            else:
+                value = NUMBER_TABLE.get(word)
+                if value is None and word.isdigit():
+                    value = int(word)
+            
+            if value is not None:
+                if index < count and tokens[index] in DURATION_UNITS:
+                    # "<n> seconds" is a duration, not an intensity
+                    if duration_ms is None:
+                        duration_ms = value * DURATION_UNITS[tokens[index]]
+                    index += 1
+                elif intensity is None:
+                    intensity = value
+            elif word in COMMAND_MODES:
+                mode = COMMAND_MODES[word]
+            elif self.names:
+                name, index = self.read_name(tokens, index - 1)
+                if name is not None and name not in targets:
+                    targets.append(name)
+        
+        return ParsedCommand(intensity, targets or None, duration_ms, mode)
+        
+    @classmethod
+    def tokenize(cls, text):
+        # Lowercase words and digit runs, punctuation and hyphens split words
+        return cls.SEPARATOR_PATTERN.sub(" ", text.lower()).split()
+        
+    def find_wake(self, tokens):
+        # Index of the first word after the wake word, None if not found
+        size = len(self.wake)
+        if not size:
+            return None
+        first = self.wake[0]
+        start = 0
+        while True:
+            try:
+                index = tokens.index(first, start)
+            except ValueError:
+                return None
+            if tokens[index:index + size] == self.wake:
+                return index + size
+            start = index + 1
+        
+    def read_name(self, tokens, index):
+        # Longest shocker name starting at index, or None and the next index
+        for span in range(min(self.name_span, len(tokens) - index), 0, -1):
+            name = self.names.get(" ".join(tokens[index:index + span]))
+            if name is not None:
+                return name, index + span
+        return None, index + 1
+        
+def build_command_grammar(wake_word, names=()):
+    # Vosk grammar limited to the wake word, shocker names and command vocabulary
+    name_words = []
+    for name in names:
+        for word in name.lower().split():
+            if word not in name_words:
+                name_words.append(word)
+    if name_words:
+        name_words.append("all")
+    return [wake_word.lower().strip()] + name_words + COMMAND_WORDS + ["[unk]"]
+
+def configured_shockers(config):
+    # Shockers from the "shockers" list, or the single control_id when it is empty.
+    # model and rf_id address a shocker through a local hub, entries without a
+    # cloud id get a local one so they can still be told apart, "cloud" is only
+    # set for ids the OpenShock API knows
+    shockers = []
+    for shocker in config.get("shockers") or []:
+        rf_id = shocker.get("rf_id")
+        model = shocker.get("model", "caixianlin")
+        if not shocker.get("id") and rf_id is None:
+            continue
+        shockers.append({
+            "name": str(shocker.get("name", "")).lower().strip(),
+            "id": shocker.get("id") or f"local:{model}:{rf_id}",
+            "cloud": bool(shocker.get("id")),
+            "max_intensity": shocker.get("max_intensity", config["max_intensity"]),
+            "duration_ms": shocker.get("duration_ms", config["duration_ms"]),
+            "model": model,
+            "rf_id": rf_id
+        })
+    
+    if not shockers and config["control_id"]:
+        shockers.append({
+            "name": "",
+            "id": config["control_id"],
+            "cloud": True,
+            "max_intensity": config["max_intensity"],
+            "duration_ms": config["duration_ms"],
+            "model": None,
+            "rf_id": None
+        })
+    return shockers
+
+def control_config_error(config):
+    # Why commands can't be sent with this config, None if they can
+    backend = config["control_backend"]
+    shockers = configured_shockers(config)
+    if backend == "local":
+        if not any(shocker["rf_id"] is not None for shocker in shockers):
+            return "The local backend needs shockers with an rf_id!"
+        if not config["local_serial_port"] and not config["local_host"]:
+            return "Please configure the local hub host or serial port first!"
+        return None
+    if not shockers or (backend != "mock" and not config["api_token"]):
+        return "Please configure API token and Control ID first!"
+    return None
+
+def model_supports_grammar(model_path):
+    # Only models with a dynamic graph (HCLr/Gr) can take a runtime grammar
+    return os.path.exists(os.path.join(model_path, "graph", "Gr.fst"))
+
+# RMS level above which a chunk counts as speech
+SPEECH_RMS_THRESHOLD = 0.01
+
+class SpeechGate:
+    # Energy based voice activity gate in front of the recognizer
+    # Silent blocks are held in a pre-roll buffer so the first phoneme of the
+    # wake word is not clipped, and decoding continues for a hangover period
+    # after speech so Vosk sees the end of the utterance.
+    # Steady background above the threshold (a fan, loopback music) would keep
+    # the gate open forever, so the quietest block of every floor_window_ms of
+    # continuous speech is taken as the new noise floor. Real speech has pauses
+    # near the true floor, steady noise does not.
+    def __init__(self, rate=16000, threshold=SPEECH_RMS_THRESHOLD,
+                 preroll_ms=300, hangover_ms=600, noise_ratio=3.0, floor_window_ms=3000):
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.preroll_samples = int(rate * preroll_ms / 1000)
+        self.hangover_samples = int(rate * hangover_ms / 1000)
+        self.floor_window_samples = int(rate * floor_window_ms / 1000)
+        self.noise_floor = threshold / noise_ratio
+        self.speech_samples = 0
+        self.speech_min_rms = None
+        self.preroll = collections.deque()
+        self.buffered = 0
+        self.active = False
+        self.silent_samples = 0
+        
+    def is_speech(self, rms, samples=320):
+        # Above both the fixed threshold and the adaptive noise floor
+        speech = rms > max(self.threshold, self.noise_floor * self.noise_ratio)
+        if not speech:
+            # Track background noise, falling fast and rising slowly
+            if rms < self.noise_floor:
+                self.noise_floor = 0.5 * self.noise_floor + 0.5 * rms
+            else:
+                self.noise_floor = 0.99 * self.noise_floor + 0.01 * rms
+            self.speech_samples = 0
+            self.speech_min_rms = None
+            return False
+        
+        # Re-estimate the floor from the quietest block of a long speech run
+        if self.speech_min_rms is None or rms < self.speech_min_rms:
+            self.speech_min_rms = rms
+        self.speech_samples += samples
+        if self.speech_samples >= self.floor_window_samples:
+            self.noise_floor = max(self.noise_floor, self.speech_min_rms)
+            self.speech_samples = 0
+            self.speech_min_rms = None
+        return True
+        
+    def process(self, block, rms):
+        # Returns (blocks to decode, utterance ended)
+        speech = self.is_speech(rms, len(block))
+        
+        if not self.active:
+            if not speech:
+                # Keep recent silence as pre-roll
+                self.preroll.append(block)
+                self.buffered += len(block)
+                while self.buffered - len(self.preroll[0]) >= self.preroll_samples:
+                    self.buffered -= len(self.preroll.popleft())
+                return [], False
+            
+            self.active = True
+            self.silent_samples = 0
+            blocks = list(self.preroll) + [block]
+            self.preroll.clear()
+            self.buffered = 0
+            return blocks, False
+        
+        if speech:
+            self.silent_samples = 0
+            return [block], False
+        
+        self.silent_samples += len(block)
+        if self.silent_samples >= self.hangover_samples:
+            self.active = False
+            return [block], True
+        return [block], False
+        
+    def reset(self):
+        self.preroll.clear()
+        self.buffered = 0
+        self.active = False
+        self.silent_samples = 0
+        self.speech_samples = 0
+        self.speech_min_rms = None
+
+class LatencyHistogram:
+    # Fixed-bucket histogram of speech end -> HTTP sent latency in ms
+    BUCKETS_MS = (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        
+    def record(self, latency_ms):
+        # Add one measurement to its bucket
+        for i, edge in enumerate(self.BUCKETS_MS):
+            if latency_ms < edge:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        
+        self.samples += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+        
+    def summary(self):
+        # One line summary with mean/max and non-empty buckets
+        if not self.samples:
+            return "no samples"
+        
+        buckets = []
+        lower = 0
+        for edge, count in zip(self.BUCKETS_MS, self.counts):
+            if count:
+                buckets.append(f"{lower}-{edge}ms: {count}")
+            lower = edge
+        if self.counts[-1]:
+            buckets.append(f">={lower}ms: {self.counts[-1]}")
+        
+        mean = self.total_ms / self.samples
+        return f"n={self.samples} mean={mean:.0f}ms max={self.max_ms:.0f}ms [{', '.join(buckets)}]"
+
+class StatsCollector:
+    # Rolling p50/p95/p99 of hot path timings plus gauges such as queue depth.
+    # Timers are installed by wrapping methods only while stats are enabled,
+    # so with stats off the audio path runs the original, unwrapped methods.
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counts = {}
+        self.gauges = {}
+        
+    def wrap(self, name, func):
+        # Return func timed into the named series
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, (time.perf_counter() - t0) * 1000)
+        return timed
+        
+    def record(self, name, ms):
+        with self.lock:
+            series = self.timings.get(name)
+            if series is None:
+                series = self.timings[name] = collections.deque(maxlen=self.window)
+                self.counts[name] = 0
+            series.append(ms)
+            self.counts[name] += 1
+            
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+        
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counts.clear()
+            self.gauges.clear()
+            
+    def snapshot(self):
+        # Percentiles over the rolling window of each series
+        with self.lock:
+            series = {name: (np.array(values), self.counts[name]) for name, values in self.timings.items()}
+            gauges = dict(self.gauges)
+        
+        timings = {}
+        for name, (values, count) in series.items():
+            if not len(values):
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            timings[name] = {
+                "count": count,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(values.max())
+            }
+        return {"time": time.time(), "timings": timings, "gauges": gauges}
+
+class StreamingResampler:
+    # Streaming windowed-sinc resampler that keeps fractional phase and filter
+    # history across blocks, so block boundaries are seamless and no samples
+    # are lost to rounding. Integer ratios (48k -> 16k) use a single
+    # decimating FIR, other ratios a polyphase filter bank. Index tables and
+    # work buffers are cached per block size, so steady state allocates no
+    # sample buffers. The returned array is reused by the next call.
+    def __init__(self, src_rate, dst_rate=16000):
+        self.src_rate = int(src_rate)
+        self.dst_rate = int(dst_rate)
+        self.passthrough = self.src_rate == self.dst_rate
+        
+        g = math.gcd(self.src_rate, self.dst_rate)
+        self.up = self.dst_rate // g
+        self.down = self.src_rate // g
+        
+        # Longer filter when decimating so the cutoff stays sharp
+        ratio = self.down / self.up
+        self.taps = max(16, 2 * math.ceil(8 * max(1.0, ratio)))
+        self.half = self.taps // 2
+        self.offsets = np.arange(self.taps) - self.half + 1
+        self.bank = self._design_bank()
+        
+        # Next output position in 1/up input samples, relative to the work buffer
+        self.history = np.zeros(self.taps, dtype=np.float32)
+        self.pos = self.taps * self.up
+        self._plans = {}
+        
+    def _design_bank(self):
+        # Blackman windowed sinc low-pass, one row of taps per phase
+        cutoff = 0.45 * min(1.0, self.up / self.down)
+        bank = np.zeros((self.up, self.taps), dtype=np.float64)
+        for phase in range(self.up):
+            d = self.offsets - phase / self.up
+            window = (0.42 + 0.5 * np.cos(np.pi * d / self.half)
+                      + 0.08 * np.cos(2 * np.pi * d / self.half))
+            window[np.abs(d) >= self.half] = 0.0
+            row = 2 * cutoff * np.sinc(2 * cutoff * d) * window
+            bank[phase] = row / row.sum()
+        return bank.astype(np.float32)
+        
+    def _plan(self, block_size):
+        # Preallocated tables and buffers for one input block size
+        plan = self._plans.get(block_size)
+        if plan is None:
+            max_out = (self.taps + block_size) * self.up // self.down + 2
+            plan = {
+                "work": np.zeros(self.taps + block_size, dtype=np.float32),
+                "k": np.arange(max_out, dtype=np.int64),
+                "pos": np.zeros(max_out, dtype=np.int64),
+                "index": np.zeros(max_out, dtype=np.int64),
+                "phase": np.zeros(max_out, dtype=np.int64),
+                "gather_index": np.zeros((max_out, self.taps), dtype=np.int64),
+                "gather": np.zeros((max_out, self.taps), dtype=np.float32),
+                "weights": np.zeros((max_out, self.taps), dtype=np.float32),
+                "out": np.zeros(max_out, dtype=np.float32)
+            }
+            self._plans[block_size] = plan
+        return plan
+        
+    def process(self, block):
+        # Resample one block, returns the output samples available so far
+        if self.passthrough:
+            return block
+        
+        n_in = len(block)
+        plan = self._plan(n_in)
+        work = plan["work"]
+        work[:self.taps] = self.history
+        work[self.taps:] = block
+        
+        # Only emit outputs whose filter window is fully inside the buffer
+        limit = (self.taps + n_in - self.half) * self.up
+        n_out = max(0, -(-(limit - self.pos) // self.down))
+        
+        if n_out:
+            pos = plan["pos"][:n_out]
+            index = plan["index"][:n_out]
+            gather_index = plan["gather_index"][:n_out]
+            gather = plan["gather"][:n_out]
+            out = plan["out"][:n_out]
+            
+            np.multiply(plan["k"][:n_out], self.down, out=pos)
+            pos += self.pos
+            np.floor_divide(pos, self.up, out=index)
+            np.add(index[:, None], self.offsets, out=gather_index)
+            np.take(work, gather_index, out=gather, mode="clip")
+            
+            if self.up == 1:
+                # Integer ratio, one set of taps
+                np.dot(gather, self.bank[0], out=out)
+            else:
+                phase = plan["phase"][:n_out]
+                weights = plan["weights"][:n_out]
+                np.remainder(pos, self.up, out=phase)
+                np.take(self.bank, phase, axis=0, out=weights, mode="clip")
+                np.multiply(gather, weights, out=gather)
+                np.sum(gather, axis=1, out=out)
+        else:
+            out = plan["out"][:0]
+        
+        self.pos += n_out * self.down - n_in * self.up
+        self.history[:] = work[n_in:]
+        return out
+        
+    def reset(self):
+        self.history[:] = 0.0
+        self.pos = self.taps * self.up
+
+class SampleRing:
+    # Fixed-capacity float32 ring buffer for one producer and one consumer
+    # thread. The producer only advances write_pos and the consumer only
+    # advances read_pos, so no lock is needed under the GIL and the audio
+    # callback never allocates. On overflow "drop_oldest" lets the producer
+    # overwrite and the consumer skips the lost samples on its next read,
+    # "block" waits up to block_timeout for space and then drops the newest.
+    def __init__(self, capacity, policy="drop_oldest", block_timeout=0.01):
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.last_write_time = None
+        
+        # Overflow counters
+        self.dropped = 0
+        self.overflows = 0
+        
+    @property
+    def available(self):
+        return min(self.write_pos - self.read_pos, self.capacity)
+        
+    def write(self, samples):
+        # Producer side, copy samples in place
+        n = len(samples)
+        
+        if self.policy == "block":
+            deadline = time.monotonic() + self.block_timeout
+            while self.capacity - (self.write_pos - self.read_pos) < n and time.monotonic() < deadline:
+                time.sleep(0.001)
+            
+            free = self.capacity - (self.write_pos - self.read_pos)
+            if free < n:
+                # Still full, drop the newest samples
+                self.dropped += n - free
+                self.overflows += 1
+                samples = samples[:free]
+                n = free
+        elif n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.write_pos += n - self.capacity
+            n = self.capacity
+        
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:n - first] = samples[first:]
+        self.write_pos += n
+        self.last_write_time = time.monotonic()
+        
+    def _skip_overrun(self):
+        # Consumer side, skip samples the producer has overwritten
+        lost = self.write_pos - self.read_pos - self.capacity
+        if lost > 0:
+            self.read_pos += lost
+            self.dropped += lost
+            self.overflows += 1
+        
+    def read(self, out):
+        # Consumer side, fill out with the oldest len(out) samples
+        self._skip_overrun()
+        n = len(out)
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:n - first]
+        self.read_pos += n
+        
+    def discard(self, n):
+        # Consumer side, drop the oldest n samples
+        self._skip_overrun()
+        self.read_pos += min(n, self.available)
+        
+    def latest(self, out):
+        # Copy the most recent samples without consuming them, for metering
+        # from a third thread. Returns the number of samples copied.
+        end = self.write_pos
+        n = min(len(out), end, self.capacity)
+        start = (end - n) % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:n] = self.buffer[:n - first]
+        return n
+        
+    def clear(self):
+        self.read_pos = self.write_pos
+
+class AudioMixer:
+    # Sums per-source 16kHz streams into the single stream fed to the recognizer
+    # The primary source (mic) sets the timeline, other sources are mixed in
+    # sample-aligned and padded or trimmed when their clocks drift apart.
+    def __init__(self, block_size=320, rate=16000, max_wait_ms=100, max_lag_ms=200):
+        self.block_size = block_size
+        self.rate = rate
+        self.max_wait = int(rate * max_wait_ms / 1000)
+        self.max_lag = int(rate * max_lag_ms / 1000)
+        self.sources = {}
+        self.primary = None
+        self.padded = 0
+        self.trimmed = 0
+        self.block_time = None
+        self._mix = np.zeros(block_size, dtype=np.float32)
+        self._scratch = np.zeros(block_size, dtype=np.float32)
+        
+    def add_source(self, name, gain=1.0, primary=False):
+        self.sources[name] = {
+            "ring": SampleRing(self.rate * 2),
+            "gain": gain,
+            "last_time": None
+        }
+        if primary:
+            self.primary = name
+            
+    def remove_source(self, name):
+        self.sources.pop(name, None)
+        
+    def set_gain(self, name, gain):
+        if name in self.sources:
+            self.sources[name]["gain"] = gain
+        
+    def push(self, name, samples, capture_time):
+        # Add resampled 16kHz samples from one source
+        source = self.sources.get(name)
+        if source is None:
+            return
+        source["ring"].write(samples)
+        source["last_time"] = capture_time
+        
+    def buffered_samples(self):
+        # Samples waiting on the primary source
+        if self.primary is None:
+            return 0
+        return self.sources[self.primary]["ring"].available
+        
+    def read(self):
+        # Return the next mixed block, or None if not enough audio yet
+        primary = self.sources.get(self.primary)
+        if primary is None or primary["ring"].available < self.block_size:
+            return None
+        
+        # Hold the block briefly while a live secondary source catches up,
+        # sources that stopped delivering (e.g. idle WASAPI loopback) are not waited on
+        primary_backlog = primary["ring"].available - self.block_size
+        for name, source in self.sources.items():
+            if name == self.primary or source["ring"].available >= self.block_size:
+                continue
+            if source["last_time"] is None or primary["last_time"] - source["last_time"] > self.max_wait / self.rate:
+                continue
+            if primary_backlog < self.max_wait:
+                return None
+        
+        primary["ring"].read(self._mix)
+        self._mix *= primary["gain"]
+        
+        for name, source in self.sources.items():
+            if name == self.primary:
+                continue
+            
+            ring = source["ring"]
+            
+            # Secondary clock running fast, trim its backlog
+            excess = ring.available - self.block_size - self.max_lag
+            if excess > 0:
+                ring.discard(excess)
+                self.trimmed += excess
+            
+            # Secondary stalled or running slow, pad with silence
+            n = min(ring.available, self.block_size)
+            self.padded += self.block_size - n
+            if n:
+                ring.read(self._scratch[:n])
+                self._scratch[:n] *= source["gain"]
+                self._mix[:n] += self._scratch[:n]
+        
+        # Capture time of the end of this block
+        if primary["last_time"] is not None:
+            self.block_time = primary["last_time"] - primary["ring"].available / self.rate
+        
+        return self._mix.copy()
+        
+    def clear(self):
+        for source in self.sources.values():
+            source["ring"].clear()
+
+# Device name keywords of MME loopback inputs
+LOOPBACK_KEYWORDS = ['stereo mix', 'wave out', 'loopback', 'what u hear', 'what you hear', 'wave out mix']
+
+# Shortest interval for the opt-in device_poll_s hot-plug rescan
+DEVICE_POLL_MIN_S = 60
+
+class DeviceRegistry:
+    # Audio devices from a single PortAudio enumeration, cached and keyed by a
+    # stable "name|host API" id so a saved choice still resolves after indexes
+    # shift when devices are plugged in or removed. PortAudio only notices new
+    # devices when it is re-initialized, which closes every open stream, so
+    # refresh(reinitialize=True) only restarts PortAudio while in_use is unset.
+    # Stream owners hold lock from resolving a device until the stream runs.
+    def __init__(self, log=print_log):
+        self.log = log
+        self.lock = threading.RLock()
+        self.devices = []
+        self.by_id = {}
+        self.loaded = False
+        self.in_use = False
+        
+    def refresh(self, reinitialize=False):
+        # Enumerate devices once, returns True if the set of devices changed
+        import sounddevice as sd
+        with self.lock:
+            if reinitialize and not self.in_use:
+                # sounddevice has no public rescan, restart PortAudio instead
+                sd._terminate()
+                sd._initialize()
+            host_apis = [api["name"] for api in sd.query_hostapis()]
+            
+            devices = []
+            by_id = {}
+            for index, info in enumerate(sd.query_devices()):
+                device_id = f"{info['name']}|{host_apis[info['hostapi']]}"
+                label = f"{info['name']} ({host_apis[info['hostapi']]})"
+                
+                # Identical devices on one host API get a numbered id
+                count = 2
+                while device_id in by_id:
+                    device_id = f"{info['name']}|{host_apis[info['hostapi']]}#{count}"
+                    label = f"{info['name']} #{count} ({host_apis[info['hostapi']]})"
+                    count += 1
+                
+                device = {
+                    "id": device_id,
+                    "label": label,
+                    "index": index,
+                    "name": info["name"],
+                    "hostapi": host_apis[info["hostapi"]],
+                    "max_input_channels": info["max_input_channels"],
+                    "max_output_channels": info["max_output_channels"],
+                    "default_samplerate": info["default_samplerate"]
+                }
+                devices.append(device)
+                by_id[device_id] = device
+            
+            changed = self.loaded and by_id.keys() != self.by_id.keys()
+            self.devices = devices
+            self.by_id = by_id
+            self.loaded = True
+        return changed
+        
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.refresh()
+        
+    def input_devices(self):
+        # Microphone choices, MME only on Windows to avoid listing each device per host API
+        self.ensure_loaded()
+        inputs = [device for device in self.devices if device["max_input_channels"] > 0]
+        mme = [device for device in inputs if "MME" in device["hostapi"]]
+        return mme or inputs
+        
+    def loopback_devices(self):
+        # MME loopback inputs and WASAPI outputs, or all inputs if there are none
+        self.ensure_loaded()
+        devices = [device for device in self.devices if device["max_input_channels"] > 0 and
+                   any(keyword in device["name"].lower() for keyword in LOOPBACK_KEYWORDS)]
+        devices += [device for device in self.devices
+                    if device["max_output_channels"] > 0 and "WASAPI" in device["hostapi"]]
+        return devices or self.input_devices()
+        
+    def resolve(self, device_id, index=None, default=False):
+        # Device for a saved id. Configs without an id fall back to their
+        # PortAudio index, and with default set to the default input device.
+        # A saved id that is missing does not use the index, it may have shifted
+        self.ensure_loaded()
+        with self.lock:
+            device = self.by_id.get(device_id)
+            if device is not None:
+                return device
+            
+            if device_id:
+                self.log(f"Audio device not found: {device_id}", level="WARNING")
+            elif index is not None and 0 <= index < len(self.devices):
+                return self.devices[index]
+        
+        if default:
+            import sounddevice as sd
+            index = sd.default.device[0]
+            with self.lock:
+                if index is not None and 0 <= index < len(self.devices):
+                    return self.devices[index]
+        return None
+        
+    def capture_rate(self, device, rate=16000):
+        # rate if the device or its host API can capture mono float32 at it,
+        # otherwise the device's native rate
+        import sounddevice as sd
+        try:
+            sd.check_input_settings(device=device["index"], samplerate=rate, channels=1, dtype="float32")
+            return rate
+        except Exception:
+            return int(device["default_samplerate"])
+
+class ModelManager:
+    # Keeps loaded Vosk models in a small LRU keyed by model path
+    # Memory use is estimated from the model's size on disk, least recently
+    # used models are released when the count or memory cap is exceeded.
+    def __init__(self, max_models=2, memory_cap_mb=4096, log=print_log):
+        self.max_models = max_models
+        self.memory_cap_mb = memory_cap_mb
+        self.log = log
+        self.models = collections.OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        
+    @staticmethod
+    def estimate_mb(model_path):
+        # Approximate resident size from the files on disk
+        total = 0
+        for dirpath, _, filenames in os.walk(model_path):
+            for filename in filenames:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+        return total / (1024 * 1024)
+        
+    def is_loaded(self, model_path):
+        with self.lock:
+            return model_path in self.models
+        
+    def get(self, model_path):
+        # Return a loaded model, loading it or waiting for a preload if needed
+        while True:
+            with self.lock:
+                if model_path in self.models:
+                    self.models.move_to_end(model_path)
+                    return self.models[model_path]["model"]
+                
+                event = self.loading.get(model_path)
+                if event is None:
+                    event = threading.Event()
+                    self.loading[model_path] = event
+                    break
+            
+            # Another thread is loading this model
+            event.wait()
+        
+        try:
+            from vosk import Model
+            started = time.monotonic()
+            model = Model(model_path)
+            size_mb = self.estimate_mb(model_path)
+            self.log(f"Loaded model {os.path.basename(model_path)} in {time.monotonic() - started:.1f} s (~{size_mb:.0f} MB)")
+            
+            with self.lock:
+                self.models[model_path] = {"model": model, "size_mb": size_mb}
+                self._evict()
+            return model
+        finally:
+            with self.lock:
+                self.loading.pop(model_path, None)
+            event.set()
+        
+    def preload(self, model_path):
+        # Load a model in the background
+        def load():
+            try:
+                self.get(model_path)
+            except Exception as e:
+                self.log(f"Failed to preload model: {e}", level="WARNING")
+        
+        threading.Thread(target=load, daemon=True).start()
+        
+    def unload(self, model_path=None):
+        # Release one model, or all of them
+        with self.lock:
+            if model_path is None:
+                self.models.clear()
+            else:
+                self.models.pop(model_path, None)
+        
+    def _evict(self):
+        # Drop least recently used models over the caps, always keep the newest
+        while len(self.models) > 1:
+            total_mb = sum(entry["size_mb"] for entry in self.models.values())
+            if len(self.models) <= self.max_models and total_mb <= self.memory_cap_mb:
+                break
+            path, _ = self.models.popitem(last=False)
+            self.log(f"Released cached model {os.path.basename(path)}")
+
+class ModelDownloader:
+    # Downloads and installs a Vosk model zip. The zip is streamed in chunks
+    # into <model>.zip.part and an interrupted download resumes with an HTTP
+    # Range request, also across restarts. The finished file is checked
+    # against the server's size and the model's sha256 when one is known,
+    # extracted into a temporary directory next to the models with every
+    # member's CRC checked, and moved into place with one rename so a half
+    # extracted model is never mistaken for an installed one.
+    CHUNK_SIZE = 64 * 1024
+        
+    def __init__(self, log=print_log, progress=None, retries=3):
+        self.log = log
+        self.progress = progress
+        self.retries = retries
+        self.session = None
+        
+    def install(self, model_info, model_dir):
+        # Download, verify and extract a model unless model_dir already exists
+        import zipfile
+        if os.path.isdir(model_dir):
+            return
+        
+        os.makedirs(os.path.dirname(model_dir), exist_ok=True)
+        part_path = model_dir + ".zip.part"
+        
+        # Zip left behind by the old non resumable downloader
+        if os.path.exists(model_dir + ".zip"):
+            os.remove(model_dir + ".zip")
+        
+        self.download(model_info["url"], part_path)
+        try:
+            self.verify(part_path, model_info.get("sha256"))
+            self.extract(part_path, model_dir)
+        except (zipfile.BadZipFile, ValueError):
+            # Corrupt download, start over next time
+            os.remove(part_path)
+            raise
+        os.remove(part_path)
+        
+    def download(self, url, part_path):
+        # Stream url into part_path, retrying and resuming on network errors
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        
+        for attempt in range(self.retries + 1):
+            try:
+                self._fetch(url, part_path)
+                return
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.retries:
+                    raise
+                self.log(f"Download interrupted ({e}), resuming...", level="WARNING")
+                time.sleep(min(2 ** attempt, 10))
+        
+    def _fetch(self, url, part_path):
+        # One request continuing from the current size of part_path
+        import requests
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        
+        with self.session.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 416:
+                # Nothing left to fetch, or the part file does not match the server
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) == offset:
+                    return
+                self.log("Partial download does not match the server, restarting", level="WARNING")
+                os.remove(part_path)
+                return self._fetch(url, part_path)
+            response.raise_for_status()
+            
+            if offset and response.status_code == 206:
+                self.log(f"Resuming download at {offset / (1024 * 1024):.1f} MB")
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                mode = "ab"
+            else:
+                if offset:
+                    self.log("Server does not support resuming, restarting download", level="WARNING")
+                offset = 0
+                total = response.headers.get("Content-Length", "")
+                mode = "wb"
+            total = int(total) if total.isdigit() else None
+            
+            done = offset
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if self.progress:
+                        self.progress(done, total)
+        
+        if total is not None and done != total:
+            raise requests.exceptions.ChunkedEncodingError(f"download ended at {done} of {total} bytes")
+        
+    def verify(self, part_path, sha256=None):
+        # Check the downloaded zip's checksum when known, and its structure
+        import hashlib
+        import zipfile
+        if sha256:
+            digest = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != sha256.lower():
+                raise ValueError("Model download checksum mismatch")
+        
+        if not zipfile.is_zipfile(part_path):
+            raise zipfile.BadZipFile("Model download is not a zip file")
+        
+    def extract(self, part_path, model_dir):
+        # Extract into a temporary directory, then rename into place
+        import shutil
+        import tempfile
+        import zipfile
+        parent = os.path.dirname(model_dir)
+        temp_dir = tempfile.mkdtemp(prefix=".extract-", dir=parent)
+        self.log("Extracting model...")
+        try:
+            with zipfile.ZipFile(part_path) as zip_ref:
+                # Reading every member checks its CRC, a mismatch raises BadZipFile
+                zip_ref.extractall(temp_dir)
+            
+            # Model zips hold one top level folder, use it if present
+            entries = os.listdir(temp_dir)
+            source = temp_dir
+            if len(entries) == 1 and os.path.isdir(os.path.join(temp_dir, entries[0])):
+                source = os.path.join(temp_dir, entries[0])
+            os.replace(source, model_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+# Outcome of a control command. status is the HTTP status code for REST,
+# detail adds backend specific timing to the round trip log line
+ControlResult = collections.namedtuple("ControlResult", "ok status text via detail", defaults=("",))
+
+class LiveChannel:
+    # Persistent SignalR connection to the OpenShock user hub. Commands go out
+    # as hub invocations on an already open WebSocket, so there is no per
+    # command connection setup or HTTP round trip. A reader thread handles
+    # completions and keepalives and reconnects with backoff.
+    RECORD_SEPARATOR = "\x1e"
+    PING_INTERVAL_S = 15
+    SERVER_TIMEOUT_S = 30
+    
+    def __init__(self, config, log=print_log):
+        self.config = config
+        self.log = log
+        self.websocket = None
+        self.ws = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.send_lock = threading.Lock()
+        self.pending = {}
+        self.next_id = 0
+        
+    @property
+    def connected(self):
+        return self.ready.is_set()
+        
+    def start(self):
+        # Start the connection thread, returns False if websocket-client is missing
+        if self.thread and self.thread.is_alive():
+            return True
+        
+        try:
+            import websocket
+        except ImportError:
+            self.log("Live control needs the websocket-client package, using HTTP", level="WARNING")
+            return False
+        
+        self.websocket = websocket
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+        
+    def stop(self):
+        # Close the connection and stop reconnecting
+        self.stop_event.set()
+        self.ready.clear()
+        self._close()
+        self.thread = None
+        
+    def wait_connected(self, timeout):
+        return self.ready.wait(timeout)
+        
+    def hub_url(self):
+        return self.config["api_base_url"].rstrip("/") + "/1/hubs/user"
+        
+    def invoke(self, target, arguments, on_done=None):
+        # Send a hub invocation, returns False if the channel is down.
+        # on_done(error) runs on the reader thread when the hub completes it
+        if not self.ready.is_set():
+            return False
+        
+        with self.send_lock:
+            self.next_id += 1
+            invocation_id = str(self.next_id)
+            if on_done:
+                self.pending[invocation_id] = on_done
+            message = {"type": 1, "invocationId": invocation_id, "target": target, "arguments": arguments}
+            try:
+                self.ws.send(json.dumps(message) + self.RECORD_SEPARATOR)
+                return True
+            except Exception as e:
+                self.pending.pop(invocation_id, None)
+                self.log(f"Live control send failed: {e}", level="WARNING")
+                return False
+        
+    def _run(self):
+        backoff = 1
+        while not self.stop_event.is_set():
+            try:
+                t0 = time.perf_counter()
+                leftover = self._connect()
+                self.ready.set()
+                self.log(f"Live control channel connected ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+                backoff = 1
+                self._read(leftover)
+            except Exception as e:
+                if not self.stop_event.is_set():
+                    self.log(f"Live control channel down ({e}), using HTTP", level="WARNING", rate_limit="live_down")
+            finally:
+                self.ready.clear()
+                self._close()
+                self._fail_pending("connection lost before completion")
+            
+            if self.stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, 30)
+        
+    def _connect(self):
+        # Negotiate, open the WebSocket and do the JSON protocol handshake,
+        # returns any messages that arrived with the handshake reply
+        import requests
+        headers = {"OpenShockToken": self.config["api_token"], "User-Agent": "PupShockVoice/1.0"}
+        response = requests.post(self.hub_url() + "/negotiate?negotiateVersion=1", headers=headers, timeout=5)
+        response.raise_for_status()
+        negotiation = response.json()
+        token = negotiation.get("connectionToken") or negotiation.get("connectionId")
+        
+        # https -> wss, http -> ws
+        url = "ws" + self.hub_url()[len("http"):] + "?id=" + urllib.parse.quote(token)
+        ws = self.websocket.create_connection(
+            url, header=[f"{key}: {value}" for key, value in headers.items()],
+            timeout=5, enable_multithread=True)
+        self.ws = ws
+        
+        ws.send(json.dumps({"protocol": "json", "version": 1}) + self.RECORD_SEPARATOR)
+        handshake, _, leftover = ws.recv().partition(self.RECORD_SEPARATOR)
+        error = json.loads(handshake or "{}").get("error")
+        if error:
+            raise ConnectionError(error)
+        
+        ws.settimeout(1.0)
+        return leftover
+        
+    def _read(self, data):
+        # Dispatch incoming messages and keep the connection alive
+        last_received = time.monotonic()
+        last_ping = last_received
+        self._handle(data)
+        
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now - last_ping >= self.PING_INTERVAL_S:
+                with self.send_lock:
+                    self.ws.send(json.dumps({"type": 6}) + self.RECORD_SEPARATOR)
+                last_ping = now
+            
+            try:
+                data = self.ws.recv()
+            except self.websocket.WebSocketTimeoutException:
+                if time.monotonic() - last_received > self.SERVER_TIMEOUT_S:
+                    raise ConnectionError("server timeout")
+                continue
+            
+            last_received = time.monotonic()
+            self._handle(data)
+        
+    def _handle(self, data):
+        for record in data.split(self.RECORD_SEPARATOR):
+            if not record:
+                continue
+            message = json.loads(record)
+            kind = message.get("type")
+            if kind == 3:
+                # Completion of one of our invocations
+                with self.send_lock:
+                    on_done = self.pending.pop(message.get("invocationId"), None)
+                if on_done:
+                    on_done(message.get("error"))
+            elif kind == 7:
+                raise ConnectionError(message.get("error") or "closed by server")
+            # Pings and hub invocations such as device status need no reply
+        
+    def _fail_pending(self, error):
+        with self.send_lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+        for on_done in pending:
+            on_done(error)
+        
+    def _close(self):
+        ws = self.ws
+        self.ws = None
+        if ws:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+class ControlBackend:
+    # Transport for control commands. send() delivers one v2 control payload
+    # and reports the outcome through on_done(ControlResult), possibly later
+    # from another thread. It returns False if the backend cannot take the
+    # command right now so the dispatcher can try the next backend.
+    name = "base"
+    
+    def __init__(self, config, log=print_log):
+        self.config = config
+        self.log = log
+        
+    @property
+    def ready(self):
+        return True
+        
+    def start(self):
+        pass
+        
+    def warm(self):
+        pass
+        
+    def wait_ready(self, timeout):
+        return self.ready
+        
+    def send(self, payload, on_done):
+        raise NotImplementedError
+        
+    def stop(self):
+        pass
+
+class RestBackend(ControlBackend):
+    # OpenShock cloud API over HTTPS. A persistent requests.Session keeps the
+    # TLS connection alive between commands
+    name = "rest"
+    
+    def __init__(self, config, log=print_log):
+        super().__init__(config, log)
+        self.session = None
+        self.last_connect = None
+        
+    def start(self):
+        import requests
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        
+        # Pools whose new connections record their setup time, see _request
+        poolmanager = adapter.poolmanager
+        poolmanager.pool_classes_by_scheme = {
+            scheme: type(pool_class.__name__, (pool_class,),
+                         {"ConnectionCls": self._timed_connection_class(pool_class.ConnectionCls)})
+            for scheme, pool_class in poolmanager.pool_classes_by_scheme.items()
+        }
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "User-Agent": "PupShockVoice/1.0"
+        })
+        
+    def control_url(self):
+        return self.config["api_base_url"].rstrip("/") + "/2/shockers/control"
+        
+    def _timed_connection_class(self, base):
+        # urllib3 connection class that stores (TCP connect, TLS handshake)
+        # milliseconds of each new connection in last_connect. TCP connect
+        # includes the DNS lookup, urllib3 does both in _new_conn
+        backend = self
+        
+        class TimedConnection(base):
+            def _new_conn(self):
+                t0 = time.perf_counter()
+                sock = super()._new_conn()
+                self.tcp_ms = (time.perf_counter() - t0) * 1000
+                return sock
+            
+            def connect(self):
+                t0 = time.perf_counter()
+                super().connect()
+                total_ms = (time.perf_counter() - t0) * 1000
+                backend.last_connect = (self.tcp_ms, total_ms - self.tcp_ms)
+        
+        return TimedConnection
+        
+    def _request(self, method, url, **kwargs):
+        # Send a request, returns the response and its timing breakdown
+        self.last_connect = None
+        response = self.session.request(method, url, timeout=5, **kwargs)
+        
+        # elapsed runs until the response headers arrive and includes connection
+        # setup. What is left after it is the request upload, server processing
+        # and one network round trip, which a client cannot tell apart
+        elapsed_ms = response.elapsed.total_seconds() * 1000
+        if self.last_connect is None:
+            return response, f"reused connection, request to headers {elapsed_ms:.0f} ms"
+        
+        tcp_ms, tls_ms = self.last_connect
+        timing = f"new connection, TCP connect incl. DNS {tcp_ms:.0f} ms"
+        if url.startswith("https"):
+            timing += f", TLS {tls_ms:.0f} ms"
+        return response, timing + f", request to headers {max(0.0, elapsed_ms - tcp_ms - tls_ms):.0f} ms"
+        
+    def warm(self):
+        # Resolve and connect to the API host, logging each step
+        url = self.config["api_base_url"].rstrip("/")
+        parsed = urllib.parse.urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        
+        t0 = time.perf_counter()
+        socket.getaddrinfo(parsed.hostname, port)
+        dns_ms = (time.perf_counter() - t0) * 1000
+        
+        _, timing = self._request("HEAD", url)
+        self.log(f"API connection ready (DNS {dns_ms:.0f} ms, {timing})")
+        
+    def send(self, payload, on_done):
+        # Send one control request, blocking until the response arrives. As a
+        # fallback for the local backend only shockers with a cloud id are sent
+        cloud_ids = {shocker["id"] for shocker in configured_shockers(self.config) if shocker["cloud"]}
+        shocks = [shock for shock in payload["shocks"] if shock["id"] in cloud_ids]
+        if not shocks:
+            on_done(ControlResult(False, "error", "no shocker in this command has a cloud id", "HTTP"))
+            return True
+        if len(shocks) < len(payload["shocks"]):
+            self.log(f"Sending {len(shocks)} of {len(payload['shocks'])} shockers over HTTP, "
+                     f"the others have no cloud id", level="WARNING")
+            payload = dict(payload, shocks=shocks)
+        
+        response, timing = self._request("POST", self.control_url(),
+                                         headers={"OpenShockToken": self.config["api_token"]}, json=payload)
+        on_done(ControlResult(response.ok, response.status_code, response.text, "HTTP", timing))
+        return True
+        
+    def stop(self):
+        if self.session:
+            self.session.close()
+            self.session = None
+
+class LiveBackend(ControlBackend):
+    # OpenShock user hub over a persistent SignalR WebSocket, see LiveChannel
+    name = "live"
+    
+    def __init__(self, config, log=print_log):
+        super().__init__(config, log)
+        self.channel = LiveChannel(config, log=log)
+        
+    @property
+    def ready(self):
+        return self.channel.connected
+        
+    def start(self):
+        self.channel.start()
+        
+    def wait_ready(self, timeout):
+        return self.channel.wait_connected(timeout)
+        
+    def send(self, payload, on_done):
+        def completed(error):
+            on_done(ControlResult(error is None, "error" if error else "ok", error or "", "live"))
+        return self.channel.invoke("ControlV2", [payload["shocks"], payload["customName"]], completed)
+        
+    def stop(self):
+        self.channel.stop()
+
+class LocalBackend(ControlBackend):
+    # OpenShock hub reachable on the LAN (TCP host/port) or over USB serial.
+    # Commands are written as rftransmit lines addressed by each shocker's
+    # model and RF id, so they never leave the local network.
+    name = "local"
+    
+    def __init__(self, config, log=print_log):
+        super().__init__(config, log)
+        self.conn = None
+        self.write = None
+        
+    def warm(self):
+        try:
+            self._open()
+        except Exception as e:
+            self.log(f"Local hub not reachable: {e}", level="WARNING")
+        
+    def _open(self):
+        # Connect on first use and after errors
+        if self.conn is not None:
+            return
+        
+        serial_port = self.config["local_serial_port"]
+        if serial_port:
+            try:
+                import serial
+            except ImportError:
+                raise RuntimeError("serial control needs the pyserial package")
+            self.conn = serial.Serial(serial_port, self.config["local_baudrate"], timeout=1, write_timeout=1)
+            self.write = self.conn.write
+            self.log(f"Local hub connected on {serial_port}")
+        else:
+            address = (self.config["local_host"], int(self.config["local_port"]))
+            self.conn = socket.create_connection(address, timeout=2)
+            self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.write = self.conn.sendall
+            self.log(f"Local hub connected on {address[0]}:{address[1]}")
+        
+    def send(self, payload, on_done):
+        # Translate the payload into one rftransmit line per shocker
+        shockers = {shocker["id"]: shocker for shocker in configured_shockers(self.config)}
+        lines = []
+        for shock in payload["shocks"]:
+            shocker = shockers.get(shock["id"])
+            if shocker is None or shocker["rf_id"] is None:
+                on_done(ControlResult(False, "error", f"no rf_id configured for shocker {shock['id']}", self.name))
+                return True
+            command = {
+                "model": shocker["model"],
+                "id": shocker["rf_id"],
+                "type": shock["type"].lower(),
+                "intensity": shock["intensity"],
+                "durationMs": shock["duration"]
+            }
+            lines.append(f"rftransmit {json.dumps(command)}\n")
+        
+        try:
+            self._open()
+            self.write("".join(lines).encode())
+        except Exception as e:
+            self.log(f"Local hub send failed: {e}", level="WARNING")
+            self.stop()
+            return False
+        
+        on_done(ControlResult(True, "sent", "", self.name))
+        return True
+        
+    def stop(self):
+        conn = self.conn
+        self.conn = None
+        self.write = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+class MockBackend(ControlBackend):
+    # In-process backend for testing, records payloads instead of sending them
+    name = "mock"
+    
+    def __init__(self, config, log=print_log):
+        super().__init__(config, log)
+        self.sent = []
+        
+    def send(self, payload, on_done):
+        delay_ms = self.config["mock_latency_ms"]
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        self.sent.append(payload)
+        on_done(ControlResult(True, "ok", "", self.name))
+        return True
+
+CONTROL_BACKENDS = {
+    "rest": RestBackend,
+    "live": LiveBackend,
+    "local": LocalBackend,
+    "mock": MockBackend
+}
+
+class ShockDispatcher:
+    # Sends control commands from a worker thread so the audio thread never
+    # blocks on the network. The configured backend is tried first, then the
+    # REST API as a fallback, and the queue is bounded so a slow backend
+    # cannot pile up stale commands.
+    def __init__(self, config, log=print_log, max_pending=4):
+        self.config = config
+        self.log = log
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.stats = None
+        self.backends = []
+        self.backend_key = None
+        self.latency_histograms = {}
+        
+    def start(self):
+        # Start the worker thread if not running
+        if self.thread and self.thread.is_alive():
+            return
+        
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        
+    def stop(self):
+        # Stop the worker, it closes all backends on the way out
+        if self.thread and self.thread.is_alive():
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                pass
+        self.thread = None
+        
+    def submit(self, payload, on_sent=None, on_done=None, deadline=None):
+        # Queue a control request, returns False if the queue is full. A request
+        # still queued at its monotonic deadline is dropped instead of sent late
+        return self._queue("control", payload, on_sent, on_done, deadline)
+        
+    def warm(self):
+        # Connect the backends ahead of the first command
+        self._queue("warm")
+        
+    def close(self):
+        # Drop persistent connections until the next command or warm up
+        self._queue("close")
+        
+    def flush(self):
+        # Block until queued requests have been sent
+        self.jobs.join()
+        
+    def wait_ready(self, timeout):
+        # Wait for warm up and for the primary backend to connect
+        self.flush()
+        return bool(self.backends) and self.backends[0].wait_ready(timeout)
+        
+    def report(self):
+        # Log round trip latency per backend
+        for name, histogram in self.latency_histograms.items():
+            if histogram.samples:
+                self.log(f"Control round trip ({name}): {histogram.summary()}")
+        
+    def _queue(self, kind, payload=None, on_sent=None, on_done=None, deadline=None):
+        self.start()
+        try:
+            self.jobs.put_nowait((kind, time.monotonic(), payload, on_sent, on_done, deadline))
+            return True
+        except queue.Full:
+            return False
+        
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            
+            kind, queued_at, payload, on_sent, on_done, deadline = job
+            try:
+                if kind == "close":
+                    self._close_backends()
+                elif kind == "warm":
+                    self._warm()
+                else:
+                    self._send(payload, queued_at, on_sent, on_done, deadline)
+            except Exception as e:
+                self.log(f"Failed to send shock: {e}", level="ERROR")
+            finally:
+                self.jobs.task_done()
+        
+        self._close_backends()
+        
+    def _warm(self):
+        # A backend that can't connect yet must not keep the others cold
+        for backend in self._ensure_backends():
+            try:
+                backend.warm()
+            except Exception as e:
+                self.log(f"Could not connect {backend.name} backend: {e}", level="WARNING")
+        
+    def _ensure_backends(self):
+        # (Re)create backends when the backend settings change. The REST
+        # fallback needs a token and at least one shocker the API knows
+        fallback = (self.config["control_fallback_rest"] and bool(self.config["api_token"])
+                    and any(shocker["cloud"] for shocker in configured_shockers(self.config)))
+        key = (self.config["control_backend"], fallback)
+        if self.backends and key == self.backend_key:
+            return self.backends
+        
+        self._close_backends()
+        name = key[0]
+        backend_class = CONTROL_BACKENDS.get(name)
+        if backend_class is None:
+            self.log(f"Unknown control backend '{name}', using rest", level="WARNING")
+            backend_class = RestBackend
+        
+        backends = [backend_class(self.config, log=self.log)]
+        if fallback and backend_class not in (RestBackend, MockBackend):
+            backends.append(RestBackend(self.config, log=self.log))
+        for backend in backends:
+            backend.start()
+        
+        self.backends = backends
+        self.backend_key = key
+        return backends
+        
+    def _close_backends(self):
+        for backend in self.backends:
+            backend.stop()
+        self.backends = []
+        self.backend_key = None
+        
+    def _send(self, payload, queued_at, on_sent, on_done, deadline=None):
+        # Send through the first backend that takes the command, a backend that
+        # raises counts as not taking it. on_done always hears about a command
+        # nothing took so the scheduler can release its cooldown
+        if deadline is not None and time.monotonic() > deadline:
+            late_ms = (time.monotonic() - deadline) * 1000
+            if on_done:
+                on_done(ControlResult(False, "expired", f"{late_ms:.0f} ms past its deadline", "dispatcher"))
+            return
+        
+        errors = []
+        try:
+            backends = self._ensure_backends()
+        except Exception as e:
+            errors.append(str(e))
+            backends = []
+        
+        for backend in backends:
+            if not backend.ready:
+                continue
+            
+            sent_at = time.monotonic()
+            
+            def completed(result, name=backend.name, sent_at=sent_at):
+                total_ms = (time.monotonic() - sent_at) * 1000
+                self.latency_histograms.setdefault(name, LatencyHistogram()).record(total_ms)
+                if self.stats:
+                    self.stats.record(f"{name}_round_trip", total_ms)
+                detail = f", {result.detail}" if result.detail else ""
+                self.log(f"Control round trip ({name}) {total_ms:.0f} ms "
+                         f"(queued {(sent_at - queued_at) * 1000:.0f} ms{detail})")
+                if on_done:
+                    on_done(result)
+            
+            try:
+                taken = backend.send(payload, completed)
+            except Exception as e:
+                self.log(f"Control via {backend.name} failed: {e}", level="WARNING")
+                errors.append(f"{backend.name}: {e}")
+                continue
+            
+            if taken:
+                if on_sent:
+                    on_sent(sent_at)
+                return
+        
+        self.log("Command dropped, no control backend available", level="ERROR")
+        if on_done:
+            on_done(ControlResult(False, "error", "; ".join(errors) or "no control backend available", "dispatcher"))
+
+class CommandScheduler:
+    # Turns recognized commands into batches for the controller. Commands heard
+    # within coalesce_ms of the first one are merged into one batch, keeping
+    # the max (or latest) command per target. The cooldown is checked and
+    # started when a command is accepted, on the monotonic clock, and a batch
+    # older than command_deadline_ms is dropped instead of firing late.
+    def __init__(self, config, send_batch, log=print_log):
+        self.config = config
+        self.send_batch = send_batch
+        self.log = log
+        self.lock = threading.Lock()
+        self.batch = None
+        self.cooldown_until = 0.0
+        
+    def submit(self, command, trigger="final", speech_time=None):
+        # Accept a ParsedCommand into the pending batch, returns False if in cooldown
+        now = time.monotonic()
+        with self.lock:
+            batch = self.batch
+            if batch is None:
+                if now < self.cooldown_until:
+                    self.log("Command heard, in cooldown", level="WARNING")
+                    return False
+                
+                self.cooldown_until = now + self.config["cooldown_seconds"]
+                origin = speech_time if speech_time is not None else now
+                batch = {
+                    "requests": {},
+                    "trigger": trigger,
+                    "speech_time": speech_time,
+                    "deadline": origin + self.config["command_deadline_ms"] / 1000,
+                    "cooldown_until": self.cooldown_until,
+                    "commands": 0
+                }
+                self.batch = batch
+                new_batch = True
+            else:
+                new_batch = False
+            
+            # Merge per target, None stands for all shockers
+            batch["commands"] += 1
+            request = (command.intensity, batch["commands"], command.duration_ms, command.mode)
+            for target in command.targets or [None]:
+                current = batch["requests"].get(target)
+                if current is None or self.config["coalesce_policy"] != "max" or request > current:
+                    batch["requests"][target] = request
+        
+        if not new_batch:
+            self.log(f"Coalesced command into pending batch ({batch['commands']} commands)")
+        elif self.config["coalesce_ms"] <= 0:
+            self.flush()
+        else:
+            timer = threading.Timer(self.config["coalesce_ms"] / 1000, self.flush)
+            timer.daemon = True
+            timer.start()
+        return True
+        
+    def flush(self):
+        # Hand the pending batch to the controller unless it is already stale
+        with self.lock:
+            batch, self.batch = self.batch, None
+        if batch is None:
+            return
+        
+        late_ms = (time.monotonic() - batch["deadline"]) * 1000
+        if late_ms > 0:
+            self.log(f"Command dropped, {late_ms:.0f} ms past its deadline", level="WARNING")
+            self.release(batch)
+            return
+        
+        self.send_batch(batch)
+        
+    def release(self, batch):
+        # Batch failed or was dropped, let the next command through
+        with self.lock:
+            if self.cooldown_until == batch["cooldown_until"]:
+                self.cooldown_until = 0.0
+
+class ShockController:
+    # Applies limits to recognized commands and hands them to the dispatcher,
+    # records speech end -> HTTP sent latency per trigger path. Cooldown and
+    # coalescing are handled by the CommandScheduler in front of it.
+    def __init__(self, config, dispatcher, log=print_log):
+        self.config = config
+        self.dispatcher = dispatcher
+        self.log = log
+        self.scheduler = CommandScheduler(config, self.send_batch, log=log)
+        self.latency_histograms = {
+            "final": LatencyHistogram(),
+            "partial": LatencyHistogram()
+        }
+        
+    def send_shock(self, command, trigger="final", speech_time=None):
+        # Queue a ParsedCommand for its targeted shockers, all if targets is None
+        self.scheduler.submit(command, trigger=trigger, speech_time=speech_time)
+        
+    def send_batch(self, batch):
+        # Send one batched shock command for a scheduler batch
+        requests_by_target = batch["requests"]
+        trigger = batch["trigger"]
+        speech_time = batch["speech_time"]
+        
+        # Per shocker limits, the global max intensity stays a hard cap
+        shocks = []
+        summary = []
+        for shocker in configured_shockers(self.config):
+            requested = [requests_by_target[key] for key in (shocker["name"], None) if key in requests_by_target]
+            if not requested:
+                continue
+            if self.config["coalesce_policy"] == "max":
+                intensity, _, duration_ms, mode = max(requested)
+            else:
+                intensity, _, duration_ms, mode = max(requested, key=lambda request: request[1])
+            value = max(0, min(intensity, shocker["max_intensity"], self.config["max_intensity"]))
+            
+            # Spoken duration overrides the shocker default within max_duration_ms
+            if duration_ms is None:
+                duration_ms = shocker["duration_ms"]
+            else:
+                duration_ms = max(100, min(duration_ms, self.config["max_duration_ms"]))
+            shocks.append({
+                "id": shocker["id"],
+                "type": mode,
+                "intensity": value,
+                "duration": int(duration_ms)
+            })
+            label = f"{shocker['name']} {value}%" if shocker["name"] else f"{value}%"
+            summary.append(label if mode == "Shock" else f"{label} {mode.lower()}")
+        summary = ", ".join(summary)
+        
+        if not shocks:
+            self.log("No shocker configured for this command", level="ERROR")
+            self.scheduler.release(batch)
+            return
+        
+        payload = {
+            "shocks": shocks,
+            "customName": "PupShockVoice"
+        }
+        
+        def on_sent(sent_at):
+            # Record speech end -> HTTP sent latency for voice triggered commands
+            if trigger and speech_time is not None:
+                latency_ms = (sent_at - speech_time) * 1000
+                self.latency_histograms[trigger].record(latency_ms)
+                self.log(f"Command latency ({trigger}): {latency_ms:.0f} ms")
+        
+        def on_done(result):
+            if result.ok:
+                self.log(f"Shock {summary} - {result.via} {result.status}")
+                return
+            
+            self.scheduler.release(batch)
+            if result.status == "expired":
+                self.log(f"Command dropped, {result.text}", level="WARNING")
+            else:
+                self.log(f"Shock {summary} - {result.via} {result.status}")
+                self.log(f"API Error: {result.text}", level="ERROR")
+        
+        # Hand off to the dispatcher, never block the audio thread on the network
+        if not self.dispatcher.submit(payload, on_sent=on_sent, on_done=on_done, deadline=batch["deadline"]):
+            self.scheduler.release(batch)
+            self.log("Command dropped, API requests still pending", level="WARNING")
+        
+    def report(self):
+        # Log command latency per trigger path
+        for path, histogram in self.latency_histograms.items():
+            if histogram.samples:
+                self.log(f"Command latency ({path}): {histogram.summary()}")
+
+class RecognitionEngine:
+    # Audio pipeline from captured blocks to recognized commands: per-source
+    # resampling, mixing, speech gating, decoding and command parsing.
+    # It has no GUI dependency so it can be driven from live capture rings
+    # (pump) or straight from files and stdin (feed). Recognized commands are
+    # passed to on_command(command, trigger, speech_time) as a ParsedCommand
+    # whose targets list the shocker names addressed, or None for all of them.
+    def __init__(self, config, log=print_log, on_command=None):
+        self.config = config
+        self.log = log
+        self.on_command = on_command
+        self.stats = None
+        
+        self.model = None
+        self.model_path = None
+        self.recognizer = None
+        self.recognizer_dirty = False
+        self.parser = None
+        self.capture_sources = {}
+        self.mixer = None
+        
+        # Speech gate and decode counters
+        self.speech_gate = None
+        self.chunks_seen = 0
+        self.decode_calls = 0
+        self.accept_calls = 0
+        self.reported_drops = 0
+        
+        # int16 batch handed to the recognizer, see allocate_pcm
+        self.pcm_bytes = None
+        self.pcm = None
+        self.pcm_scratch = None
+        self.pcm_block = 0
+        self.pcm_fill = 0
+        self.pcm_batch = None
+        self.pcm_from_buffer = memoryview
+        
+        # Backpressure state
+        self.buffered_ms = 0
+        self.degraded = False
+        self.skipped_ms = 0
+        
+        # Runtime state
+        self.last_command_text = ""
+        self.silence_start = None
+        self.has_speech = False
+        self.last_speech_time = None
+        
+        # Low latency mode state
+        self.partial_command = None
+        self.partial_since = None
+        self.partial_triggered = False
+        
+    def start_session(self, model, model_path):
+        # Prepare recognizer, mixer and gate for a new run, sources are added after
+        self.model = model
+        self.model_path = model_path
+        self.recognizer = self.create_recognizer(announce=True)
+        
+        self.mixer = AudioMixer()
+        self.capture_sources = {}
+        self.speech_gate = SpeechGate(preroll_ms=self.config["vad_preroll_ms"],
+                                      hangover_ms=self.config["vad_hangover_ms"])
+        self.allocate_pcm()
+        
+        self.chunks_seen = 0
+        self.decode_calls = 0
+        self.accept_calls = 0
+        self.reported_drops = 0
+        self.degraded = False
+        self.skipped_ms = 0
+        self.has_speech = False
+        self.silence_start = None
+        self.reset_state()
+        
+    def allocate_pcm(self):
+        # One decode_block_ms batch of int16 samples, at least one mixer block
+        # so 0 decodes every block. The array is a view of a bytearray and
+        # pcm_batch a view of the same memory in the form the recognizer
+        # takes, so a full batch goes to AcceptWaveform without a copy
+        self.pcm_block = max(self.mixer.block_size, int(16000 * self.config["decode_block_ms"] / 1000))
+        self.pcm_bytes = bytearray(self.pcm_block * 2)
+        self.pcm = np.frombuffer(self.pcm_bytes, dtype=np.int16)
+        self.pcm_batch = self.pcm_from_buffer(self.pcm_bytes)
+        self.pcm_scratch = np.zeros(self.pcm_block, dtype=np.float32)
+        self.pcm_fill = 0
+        
+    def instrument(self, stats):
+        # Install timing hooks for this session, or remove them when stats is None
+        self.stats = stats
+        vars(self).pop("parse_command", None)
+        if stats:
+            self.parse_command = stats.wrap("parse_command", self.parse_command)
+        
+    def add_source(self, name, rate, primary=False):
+        # Register an input stream at its native rate
+        self.capture_sources[name] = self.create_capture_source(rate)
+        self.mixer.add_source(name, primary=primary)
+        
+    def remove_source(self, name):
+        self.capture_sources.pop(name, None)
+        self.mixer.remove_source(name)
+        
+    def create_capture_source(self, rate):
+        # Ring buffer, resampler and read block for one input stream
+        capacity = int(rate * self.config["ring_buffer_ms"] / 1000)
+        resampler = StreamingResampler(rate)
+        if self.stats:
+            resampler.process = self.stats.wrap("resample", resampler.process)
+        return {
+            "rate": rate,
+            "ring": SampleRing(capacity, policy=self.config["overflow_policy"]),
+            "resampler": resampler,
+            "block": np.zeros(self.config["chunk_size"], dtype=np.float32)
+        }
+        
+    def pump(self):
+        # Move captured audio from the ring buffers through the pipeline,
+        # returns False when no source had a full block ready
+        self.enforce_latency_budget()
+        got_audio = False
+        
+        for name, source in list(self.capture_sources.items()):
+            ring = source["ring"]
+            block = source["block"]
+            if ring.available < len(block):
+                continue
+        
+            got_audio = True
+            ring.read(block)
+            capture_time = ring.last_write_time - ring.available / source["rate"]
+            self.feed(name, block, capture_time)
+        
+        if not got_audio:
+            return False
+        
+        # Report ring buffer overflows
+        drops = sum(source["ring"].dropped for source in self.capture_sources.values())
+        if drops > self.reported_drops:
+            self.log(f"Audio buffer overflow, dropped {drops - self.reported_drops} frames",
+                     level="WARNING", rate_limit="overflow")
+            self.reported_drops = drops
+        
+        return True
+        
+    def feed(self, name, block, capture_time):
+        # Resample one block from a source and decode any complete mixed blocks
+        chunk = self.capture_sources[name]["resampler"].process(block)
+        self.mixer.push(name, chunk, capture_time)
+        
+        # Apply current mix ratio
+        if "loopback" in self.mixer.sources:
+            ratio = self.config["loopback_mix_ratio"]
+            self.mixer.set_gain("mic", 1.0 - ratio)
+            self.mixer.set_gain("loopback", ratio)
+        
+        while True:
+            mixed = self.mixer.read()
+            if mixed is None:
+                break
+            self.process_audio_chunk(mixed, self.mixer.block_time)
+        
+    def flush(self):
+        # End of input, finalize any pending utterance
+        if self.recognizer:
+            self.decode_pending(None)
+            result = json.loads(self.recognizer.FinalResult())
+            self.handle_final_result(result.get("text", "").lower().strip())
+        
+    def report(self):
+        # Log decode counts and audio lost to overflow or skipping
+        if self.chunks_seen:
+            skipped = 100 * (1 - self.decode_calls / self.chunks_seen)
+            self.log(f"Decoded {self.decode_calls} of {self.chunks_seen} chunks ({skipped:.0f}% skipped as silence) "
+                     f"in {self.accept_calls} decoder calls")
+        
+        if self.skipped_ms:
+            self.log(f"Skipped {self.skipped_ms:.0f} ms of audio to stay within latency budget", level="WARNING")
+        
+        # Report frames lost to ring buffer overflow
+        for name, source in self.capture_sources.items():
+            ring = source["ring"]
+            if ring.dropped:
+                self.log(f"{name}: dropped {ring.dropped} frames in {ring.overflows} overflows", level="WARNING")
+        
+    def get_buffered_ms(self):
+        # Audio captured but not yet decoded, in milliseconds
+        buffered = 0.0
+        if "mic" in self.capture_sources:
+            source = self.capture_sources["mic"]
+            buffered += source["ring"].available / source["rate"] * 1000
+        if self.mixer is not None:
+            buffered += self.mixer.buffered_samples() / self.mixer.rate * 1000
+        return buffered
+        
+    def enforce_latency_budget(self):
+        # Keep decoder backlog within max_buffered_ms
+        budget = self.config["max_buffered_ms"]
+        self.buffered_ms = self.get_buffered_ms()
+        
+        if self.buffered_ms > budget:
+            # Too far behind, skip ahead to live audio
+            for source in self.capture_sources.values():
+                ring = source["ring"]
+                ring.discard(max(0, ring.available - len(source["block"])))
+            self.mixer.clear()
+        
+            skipped = self.buffered_ms - self.get_buffered_ms()
+            self.skipped_ms += skipped
+            self.log(f"Decoder {self.buffered_ms:.0f} ms behind, skipped {skipped:.0f} ms of audio", level="WARNING")
+            self.buffered_ms = self.get_buffered_ms()
+            self.reset_state()
+            self.degraded = True
+        elif not self.degraded and self.buffered_ms > budget / 2:
+            # Falling behind, only decode chunks with speech energy
+            self.degraded = True
+            self.log(f"Decoder {self.buffered_ms:.0f} ms behind, decoding speech only", level="WARNING")
+        elif self.degraded and self.buffered_ms < budget / 4:
+            self.degraded = False
+            self.log("Decoder caught up")
+        
+    def create_recognizer(self, announce=False):
+        # Create a 16kHz recognizer, grammar constrained if enabled, and the
+        # command parser for the same wake word and shocker names
+        from vosk import KaldiRecognizer, _ffi
+        self.recognizer_dirty = False
+        
+        # Vosk passes audio to a cffi char pointer, which takes a cffi view
+        # of a buffer but neither a bytearray nor a memoryview
+        self.pcm_from_buffer = _ffi.from_buffer
+        recognizer = None
+        names = [shocker["name"] for shocker in configured_shockers(self.config)]
+        self.parser = CommandParser(self.config["wake_word"], names)
+        
+        if self.config["command_grammar"]:
+            if model_supports_grammar(self.model_path):
+                grammar = build_command_grammar(self.config["wake_word"], names)
+                if announce:
+                    self.log(f"Using command grammar ({len(grammar)} words)")
+                recognizer = KaldiRecognizer(self.model, 16000, json.dumps(grammar))
+            elif announce:
+                self.log("Model does not support command grammar, using open vocabulary", level="WARNING")
+        
+        if recognizer is None:
+            recognizer = KaldiRecognizer(self.model, 16000)
+        recognizer.SetWords(True)
+        
+        if self.stats:
+            recognizer.AcceptWaveform = self.stats.wrap("AcceptWaveform", recognizer.AcceptWaveform)
+        return recognizer
+        
+    def process_audio_chunk(self, chunk, capture_time=None):
+        # Process a chunk of mixed 16kHz audio
+        # Skip if recognizer not ready
+        if not self.recognizer:
+            return
+        
+        # Wake word or grammar mode changed while listening
+        if self.recognizer_dirty:
+            self.recognizer = self.create_recognizer(announce=True)
+            self.partial_triggered = False
+        
+        if capture_time is None:
+            capture_time = time.monotonic()
+        
+        self.chunks_seen += 1
+        
+        # Track when speech was last heard for latency measurement
+        rms = math.sqrt(float(np.dot(chunk, chunk)) / max(1, len(chunk)))
+        if rms > SPEECH_RMS_THRESHOLD:
+            self.last_speech_time = capture_time
+        
+        if not self.config["vad_enabled"]:
+            if self.degraded and rms <= SPEECH_RMS_THRESHOLD:
+                # Cheaper path while behind, skip silent chunks
+                return
+            self.decode_chunk(chunk, capture_time)
+            return
+        
+        # Only decode speech plus pre-roll and hangover
+        blocks, ended = self.speech_gate.process(chunk, rms)
+        self.has_speech = self.speech_gate.active
+        if self.speech_gate.active and self.speech_gate.silent_samples:
+            if self.silence_start is None:
+                self.silence_start = capture_time
+        else:
+            self.silence_start = None
+        
+        for block in blocks:
+            self.decode_chunk(block, capture_time)
+        
+        if ended:
+            # Flush the utterance instead of waiting for Vosk's endpointer
+            self.decode_pending(capture_time)
+            result = json.loads(self.recognizer.FinalResult())
+            self.handle_final_result(result.get("text", "").lower().strip())
+        
+    def decode_chunk(self, chunk, capture_time):
+        # Add one 16kHz float32 chunk to the int16 batch, the recognizer runs
+        # once per decode_block_ms of audio to amortize its per call overhead
+        self.decode_calls += 1
+        
+        start = 0
+        while start < len(chunk):
+            n = min(len(chunk) - start, self.pcm_block - self.pcm_fill)
+            self.to_int16(chunk[start:start + n])
+            start += n
+            if self.pcm_fill == self.pcm_block:
+                self.decode_pending(capture_time)
+                
+    def to_int16(self, samples):
+        # Clip and convert float32 samples into the batch, no allocation
+        n = len(samples)
+        scratch = self.pcm_scratch[:n]
+        np.multiply(samples, 32767, out=scratch)
+        np.clip(scratch, -32768, 32767, out=scratch)
+        self.pcm[self.pcm_fill:self.pcm_fill + n] = scratch
+        self.pcm_fill += n
+        
+    def decode_pending(self, capture_time):
+        # Feed the batched audio to the recognizer
+        if not self.pcm_fill:
+            return
+        
+        # A partial batch at the end of an utterance is a view of its prefix
+        if self.pcm_fill == self.pcm_block:
+            data = self.pcm_batch
+        else:
+            data = self.pcm_from_buffer(memoryview(self.pcm_bytes)[:self.pcm_fill * 2])
+        self.pcm_fill = 0
+        self.accept_calls += 1
+        
+        final = self.recognizer.AcceptWaveform(data)
+        
+        if final:
+            # Final result - only process complete results
+            result = json.loads(self.recognizer.Result())
+            self.handle_final_result(result.get("text", "").lower().strip())
+        elif self.config["low_latency_mode"] and not self.partial_triggered and capture_time is not None:
+            # Check the partial hypothesis so commands fire before trailing silence
+            partial = json.loads(self.recognizer.PartialResult())
+            text = partial.get("partial", "").lower().strip()
+            
+            if text:
+                self.process_partial(text, capture_time)
+                
+    def handle_final_result(self, text):
+        # Act on a final result unless a partial already handled it
+        if self.partial_triggered:
+            # Utterance was already acted on from a partial result
+            if text:
+                self.log(f"Heard: {text} (already handled)")
+            self.reset_state()
+            return
+        
+        self.partial_command = None
+        self.partial_since = None
+        
+        if text:
+            self.process_transcription(text)
+                
+    def process_partial(self, text, capture_time):
+        # Fire on a partial result once the wake word and command are stable
+        command = self.parse_command(text)
+        if command is None or command.intensity is None:
+            return
+        
+        if command != self.partial_command:
+            # New or changed command, wait for it to settle
+            self.partial_command = command
+            self.partial_since = capture_time
+            return
+        
+        if (capture_time - self.partial_since) * 1000 < self.config["partial_stable_ms"]:
+            return
+        
+        self.partial_triggered = True
+        self.last_command_text = text
+        self.log(f"Heard (partial): {text}")
+        self.on_command(command, "partial", self.last_speech_time)
+                
+    def parse_command(self, text):
+        # ParsedCommand for the text after the wake word, None without wake word
+        if self.parser is None:
+            names = [shocker["name"] for shocker in configured_shockers(self.config)]
+            self.parser = CommandParser(self.config["wake_word"], names)
+        return self.parser.parse(text)
+        
+    def process_transcription(self, text):
+        # Process transcribed text for wake word and commands
+        # Skip empty results
+        if not text:
+            self.has_speech = False
+            return
+        
+        self.last_command_text = text
+        self.log(f"Heard: {text}")
+        
+        # Check for wake word and command
+        command = self.parse_command(text)
+        if command is not None:
+            if command.intensity is not None:
+                self.on_command(command, "final", self.last_speech_time)
+                self.reset_state()
+            else:
+                self.log("Wake word heard, no intensity")
+            
+    def reset_state(self):
+        # Reset all state variables
+        self.last_command_text = ""
+        self.last_speech_time = None
+        self.partial_command = None
+        self.partial_since = None
+        self.partial_triggered = False
+        self.pcm_fill = 0
+        # Reset Vosk recognizer in place, no reallocation on the hot path
+        if self.recognizer:
+            if self.recognizer_dirty:
+                self.recognizer = self.create_recognizer(announce=True)
+            else:
+                self.recognizer.Reset()
+
 class VoiceShockApp:
     def __init__(self):
         # Init main window
@@ -55,23 +2367,22 @@ class VoiceShockApp:
         self.config_file = "config.json"
         self.load_config()
         
+        # Logging pipeline, usable from any thread
+        self.setup_logging()
+        
         # Variables
         self.running = False
-        self.model = None
-        self.recognizer = None
         self.stream = None
         self.loopback_stream = None
-        self.audio_queue = queue.Queue()
-        
-        # Runtime state
-        self.last_action_time = 0
-        self.last_command_text = ""
-        self.silence_start = None
-        self.has_speech = False
-        self.last_speech_time = None
+        self.status_text = "Stopped"
         
         # Audio level for VU meter
         self.current_audio_level = 0
+        self.vu_peak = 0.0
+        self.vu_peak_time = 0.0
+        self.vu_scheduled = False
+        self.vu_samples = None
+        self.window_hidden = False
         
         # Tray icon
         self.tray_icon = None
@@ -81,41 +2392,51 @@ class VoiceShockApp:
         self.latest_version = None
         self.download_url = None
         
+        # Audio devices are enumerated once and looked up by stable id
+        self.device_registry = DeviceRegistry(log=self.log_message)
+        self.device_scan_pending = True
+        
+        # Loaded models are cached across start/stop
+        self.model_manager = ModelManager(max_models=self.config["model_cache_size"],
+                                          memory_cap_mb=self.config["model_cache_mb"],
+                                          log=self.log_message)
+        
+        # Hot path timings, only hooked in while stats are enabled
+        self.stats = StatsCollector()
+        self.last_stats_dump = 0.0
+        
+        # Control requests are sent from a worker thread
+        self.dispatcher = ShockDispatcher(self.config, log=self.log_message)
+        self.controller = ShockController(self.config, self.dispatcher, log=self.log_message)
+        
+        # Recognition pipeline, shared with the headless replay mode
+        self.engine = RecognitionEngine(self.config, log=self.log_message, on_command=self.send_shock)
+        
         # Build UI
         self.create_ui()
         
-        # Start VU meter
-        self.update_vu_meter()
+        # Start VU meter and status bar
+        self.start_vu_meter()
+        self.update_status_bar()
+        self.update_stats()
+        self.drain_log_queue()
+        
+        # Slow startup work waits until the window has been drawn
+        self.root.after_idle(self.start_background_init)
         
-        # Check for updates in background
+    def start_background_init(self):
+        # Enumerate devices, check for updates and preload the configured
+        # model in the background so the first start is instant
+        threading.Thread(target=self.load_audio_devices, daemon=True).start()
         self.check_for_updates()
+        self.preload_model()
+        
+        if self.config["device_poll_s"] > 0:
+            self.root.after(self.device_poll_ms(), self.poll_audio_devices)
         
     def load_config(self):
         # Load default config and override with file if exists
-        default_config = {
-            "api_token": "",
-            "control_id": "",
-            "wake_word": "shock",
-            "audio_device": 0,
-            "max_intensity": 40,
-            "duration_ms": 1000,
-            "cooldown_seconds": 10,
-            "chunk_size": 512,
-            "model_size": "small",
-            "loopback_enabled": False,
-            "loopback_device": 0,
-            "loopback_mix_ratio": 0.5
-        }
-        
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r') as f:
-                    loaded_config = json.load(f)
-                    default_config.update(loaded_config)
-            except Exception as e:
-                print(f"Error loading config: {e}")
-        
-        self.config = default_config
+        self.config = load_config_file(self.config_file)
         
     def save_config(self):
         # Save current config to file
@@ -129,6 +2450,7 @@ class VoiceShockApp:
     def check_for_updates(self):
         # Check for updates thru github
         def check():
+            import requests
             try:
                 # Ping GitHub API for latest release
                 url = f"https://api.github.com/repos/{GITHUB_REPO}/releases/latest"
@@ -196,9 +2518,25 @@ class VoiceShockApp:
     
     def get_model_path(self):
         # Get path to vosk model based on config
-        model_info = VOSK_MODELS.get(self.config["model_size"], VOSK_MODELS["small"])
-        model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", model_info["name"])
-        return model_dir
+        return get_model_path(self.config["model_size"])
+    
+    def preload_model(self):
+        # Load the configured model in the background if it is downloaded
+        model_path = self.get_model_path()
+        if os.path.exists(model_path) and not self.model_manager.is_loaded(model_path):
+            self.log_message(f"Preloading {self.config['model_size']} model in background...")
+            self.model_manager.preload(model_path)
+    
+    def unload_models(self):
+        # Release all cached models
+        if self.running:
+            self.log_message("Stop listening before unloading the model", level="WARNING")
+            return
+        
+        self.engine.recognizer = None
+        self.engine.model = None
+        self.model_manager.unload()
+        self.log_message("Unloaded cached models")
     
     def download_model(self, model_size):
         # Download model if not present
@@ -212,29 +2550,31 @@ class VoiceShockApp:
         self.log_message(f"Downloading model: {model_info['name']} ({model_info['size']})")
         self.log_message("This may take a while on first run...")
         
+        last_update = {"time": 0.0}
+        
+        def on_progress(done, total):
+            # Throttled progress in the status bar
+            now = time.monotonic()
+            if now - last_update["time"] < 0.25 and done != total:
+                return
+            last_update["time"] = now
+            done_mb = done / (1024 * 1024)
+            if total:
+                self.set_status(f"Downloading model {100 * done / total:.0f}% ({done_mb:.0f}/{total / (1024 * 1024):.0f} MB)")
+            else:
+                self.set_status(f"Downloading model ({done_mb:.0f} MB)")
+        
         try:
-            # Create models directory
-            os.makedirs(os.path.dirname(model_dir), exist_ok=True)
-            
-            # Download zip file
-            zip_path = model_dir + ".zip"
-            self.log_message("Downloading...")
-            urllib.request.urlretrieve(model_info["url"], zip_path)
-            
-            # Extract
-            self.log_message("Extracting model...")
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(os.path.dirname(model_dir))
-            
-            # Clean up zip
-            os.remove(zip_path)
-            
+            downloader = ModelDownloader(log=self.log_message, progress=on_progress)
+            downloader.install(model_info, model_dir)
             self.log_message("Model download complete!")
             return True
             
         except Exception as e:
             self.log_message(f"Failed to download model: {e}", level="ERROR")
             return False
+        finally:
+            self.set_status("Loading model...")
             
     def create_ui(self):
         # Create main UI
@@ -247,12 +2587,14 @@ class VoiceShockApp:
         self.notebook.add("Audio")
         self.notebook.add("Settings")
         self.notebook.add("API")
+        self.notebook.add("Stats")
         
         # Create tab contents
         self.create_console_tab()
         self.create_audio_tab()
         self.create_settings_tab()
         self.create_api_tab()
+        self.create_stats_tab()
         
         # Add control buttons
         self.create_control_panel()
@@ -296,31 +2638,18 @@ class VoiceShockApp:
         ctk.CTkLabel(device_frame, text="Microphone Input Device", 
                     font=ctk.CTkFont(size=16, weight="bold")).pack(pady=5)
         
-        # Get audio devices
-        self.audio_devices = []
-        host_apis = sd.query_hostapis()
-        
-        # Find MME host API index
-        mme_index = None
-        for i, api in enumerate(host_apis):
-            if 'MME' in api['name']:
-                mme_index = i
-                break
-        
-        for i, device in enumerate(sd.query_devices()):
-            if device["max_input_channels"] > 0:
-                # Filter to just MME devices, or all if none found
-                if mme_index is None or device['hostapi'] == mme_index:
-                    self.audio_devices.append(f"{i}: {device['name']}")
+        # Devices are filled in by load_audio_devices once the window is up
+        self.audio_device_ids = {}
+        self.device_var = ctk.StringVar(value="Loading devices...")
+        self.device_menu = ctk.CTkOptionMenu(device_frame, variable=self.device_var,
+                                             values=["Loading devices..."],
+                                             command=self.on_device_change,
+                                             state="disabled")
+        self.device_menu.pack(pady=10, padx=20, fill="x")
         
-        self.device_var = ctk.StringVar(value=self.audio_devices[self.config["audio_device"]] 
-                                        if self.config["audio_device"] < len(self.audio_devices) 
-                                        else self.audio_devices[0])
-        
-        device_menu = ctk.CTkOptionMenu(device_frame, variable=self.device_var,
-                                       values=self.audio_devices,
-                                       command=self.on_device_change)
-        device_menu.pack(pady=10, padx=20, fill="x")
+        ctk.CTkButton(device_frame, text="Refresh Devices",
+                     command=self.refresh_audio_devices,
+                     width=140).pack(pady=(0, 10))
         
         # System audio device selection
         loopback_frame = ctk.CTkFrame(tab)
@@ -335,47 +2664,12 @@ class VoiceShockApp:
                        variable=self.loopback_enabled_var,
                        command=self.on_loopback_toggle).pack(pady=5)
         
-        # Get loopback devices
-        self.loopback_devices = []
-        
-        # Find WASAPI host API index
-        wasapi_index = None
-        for i, api in enumerate(host_apis):
-            if 'WASAPI' in api['name']:
-                wasapi_index = i
-                break
-        
-        # Look for MME loopback devices
-        for i, device in enumerate(sd.query_devices()):
-            device_name = device['name'].lower()
-            if device["max_input_channels"] > 0 and any(keyword in device_name for keyword in 
-                ['stereo mix', 'wave out', 'loopback', 'what u hear', 'what you hear', 'wave out mix']):
-                self.loopback_devices.append(f"{i}: {device['name']} (MME Loopback)")
-        
-        # Add WASAPI output devices
-        if wasapi_index is not None:
-            for i, device in enumerate(sd.query_devices()):
-                if device["max_output_channels"] > 0 and device['hostapi'] == wasapi_index:
-                    self.loopback_devices.append(f"{i}: {device['name']} (WASAPI)")
-        
-        # If no devices found list everything
-        if not self.loopback_devices:
-            for i, device in enumerate(sd.query_devices()):
-                if device["max_input_channels"] > 0:
-                    if mme_index is None or device['hostapi'] == mme_index:
-                        self.loopback_devices.append(f"{i}: {device['name']} (MME)")
-        
-        # Fallback message if nothing found
-        if not self.loopback_devices:
-            self.loopback_devices = ["0: No devices found - Check audio settings"]
-        
-        self.loopback_device_var = ctk.StringVar(value=self.loopback_devices[0])
-        if self.config["loopback_device"] < len(self.loopback_devices):
-            self.loopback_device_var.set(self.loopback_devices[self.config["loopback_device"]])
-        
+        self.loopback_device_ids = {}
+        self.loopback_device_var = ctk.StringVar(value="Loading devices...")
         self.loopback_menu = ctk.CTkOptionMenu(loopback_frame, variable=self.loopback_device_var,
-                                              values=self.loopback_devices,
-                                              command=self.on_loopback_device_change)
+                                              values=["Loading devices..."],
+                                              command=self.on_loopback_device_change,
+                                              state="disabled")
         self.loopback_menu.pack(pady=10, padx=20, fill="x")
         
         # Mix ratio slider
@@ -419,6 +2713,13 @@ class VoiceShockApp:
                                   highlightthickness=0)
         self.vu_canvas.pack(fill="both", expand=True, padx=20, pady=10)
         
+        # Meter items are created once and only moved afterwards
+        self.vu_bar = self.vu_canvas.create_rectangle(0, 0, 0, 0, fill="#00ff00", outline="")
+        self.vu_peak_line = self.vu_canvas.create_line(0, 0, 0, 0, fill="#ffffff", width=2)
+        self.vu_markers = [self.vu_canvas.create_line(0, 0, 0, 0, fill="#555555", width=1)
+                           for _ in range(11)]
+        self.vu_canvas.bind("<Configure>", self.on_vu_resize)
+        
         # Status label
         self.status_label = ctk.CTkLabel(vu_frame, text="Status: Stopped", 
                                         font=ctk.CTkFont(size=14))
@@ -479,10 +2780,48 @@ class VoiceShockApp:
                                  text_color="gray")
         model_info.pack(side="left", padx=10)
         
+        ctk.CTkButton(model_frame, text="Unload Model",
+                     command=self.unload_models,
+                     width=120).pack(side="right", padx=5)
+        
+        # Low latency mode toggle
+        latency_frame = ctk.CTkFrame(scroll_frame)
+        latency_frame.pack(fill="x", pady=5, padx=5)
+        self.low_latency_var = ctk.BooleanVar(value=self.config["low_latency_mode"])
+        ctk.CTkCheckBox(latency_frame, text="Low Latency Mode",
+                       variable=self.low_latency_var).pack(side="left", padx=5)
+        ctk.CTkLabel(latency_frame,
+                    text="(act on partial results instead of waiting for silence)",
+                    font=ctk.CTkFont(size=10),
+                    text_color="gray").pack(side="left", padx=10)
+        
+        # Command grammar toggle
+        grammar_frame = ctk.CTkFrame(scroll_frame)
+        grammar_frame.pack(fill="x", pady=5, padx=5)
+        self.command_grammar_var = ctk.BooleanVar(value=self.config["command_grammar"])
+        ctk.CTkCheckBox(grammar_frame, text="Command Grammar",
+                       variable=self.command_grammar_var).pack(side="left", padx=5)
+        ctk.CTkLabel(grammar_frame,
+                    text="(only listen for the wake word and numbers, much less CPU)",
+                    font=ctk.CTkFont(size=10),
+                    text_color="gray").pack(side="left", padx=10)
+        
+        # Voice activity detection toggle
+        vad_frame = ctk.CTkFrame(scroll_frame)
+        vad_frame.pack(fill="x", pady=5, padx=5)
+        self.vad_enabled_var = ctk.BooleanVar(value=self.config["vad_enabled"])
+        ctk.CTkCheckBox(vad_frame, text="Skip Silence",
+                       variable=self.vad_enabled_var).pack(side="left", padx=5)
+        ctk.CTkLabel(vad_frame,
+                    text="(only decode audio that contains speech, saves CPU when idle)",
+                    font=ctk.CTkFont(size=10),
+                    text_color="gray").pack(side="left", padx=10)
+        
         # Create sliders for numeric settings
         self.create_slider(scroll_frame, "Max Intensity (%)", "max_intensity", 0, 100, 1)
         self.create_slider(scroll_frame, "Duration (ms)", "duration_ms", 100, 5000, 100)
         self.create_slider(scroll_frame, "Cooldown (sec)", "cooldown_seconds", 1, 60, 1)
+        self.create_slider(scroll_frame, "Coalesce Window (ms)", "coalesce_ms", 0, 1000, 50)
         
         # Save button
         ctk.CTkButton(scroll_frame, text="Save Settings", 
@@ -538,6 +2877,36 @@ class VoiceShockApp:
         ctk.CTkEntry(control_frame, textvariable=self.control_id_var, 
                     width=400).pack(side="left", fill="x", expand=True, padx=5)
         
+        # Control backend selection
+        backend_frame = ctk.CTkFrame(frame)
+        backend_frame.pack(fill="x", pady=10, padx=20)
+        ctk.CTkLabel(backend_frame, text="Backend:", width=100).pack(side="left", padx=5)
+        self.control_backend_var = ctk.StringVar(value=self.config["control_backend"])
+        ctk.CTkOptionMenu(backend_frame, variable=self.control_backend_var,
+                         values=list(CONTROL_BACKENDS)).pack(side="left", padx=5)
+        self.control_fallback_var = ctk.BooleanVar(value=self.config["control_fallback_rest"])
+        ctk.CTkCheckBox(backend_frame, text="Fall back to HTTP",
+                       variable=self.control_fallback_var).pack(side="left", padx=10)
+        ctk.CTkLabel(backend_frame,
+                    text="(rest=HTTP API, live=persistent WebSocket, local=LAN/serial hub, mock=no device)",
+                    font=ctk.CTkFont(size=10),
+                    text_color="gray").pack(side="left", padx=10)
+        
+        # Local hub address
+        local_frame = ctk.CTkFrame(frame)
+        local_frame.pack(fill="x", pady=10, padx=20)
+        ctk.CTkLabel(local_frame, text="Local Hub:", width=100).pack(side="left", padx=5)
+        self.local_host_var = ctk.StringVar(value=self.config["local_host"])
+        ctk.CTkEntry(local_frame, textvariable=self.local_host_var,
+                    placeholder_text="host", width=160).pack(side="left", padx=5)
+        self.local_port_var = ctk.StringVar(value=str(self.config["local_port"] or ""))
+        ctk.CTkEntry(local_frame, textvariable=self.local_port_var,
+                    placeholder_text="port", width=70).pack(side="left", padx=5)
+        ctk.CTkLabel(local_frame, text="or serial port:").pack(side="left", padx=5)
+        self.local_serial_var = ctk.StringVar(value=self.config["local_serial_port"])
+        ctk.CTkEntry(local_frame, textvariable=self.local_serial_var,
+                    placeholder_text="COM3", width=100).pack(side="left", padx=5)
+        
         # Button frame for test and save
         button_frame = ctk.CTkFrame(frame)
         button_frame.pack(pady=20)
@@ -550,6 +2919,44 @@ class VoiceShockApp:
                      command=self.test_api,
                      width=200).pack(side="left", padx=5)
         
+    def create_stats_tab(self):
+        # Create hot path stats tab
+        tab = self.notebook.tab("Stats")
+        
+        frame = ctk.CTkFrame(tab)
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        ctk.CTkLabel(frame, text="Performance Stats",
+                    font=ctk.CTkFont(size=16, weight="bold")).pack(pady=5)
+        
+        # Enable toggle and JSONL output
+        options_frame = ctk.CTkFrame(frame)
+        options_frame.pack(fill="x", pady=5, padx=5)
+        self.stats_enabled_var = ctk.BooleanVar(value=self.config["stats_enabled"])
+        ctk.CTkCheckBox(options_frame, text="Collect Stats",
+                       variable=self.stats_enabled_var).pack(side="left", padx=5)
+        ctk.CTkLabel(options_frame, text="JSONL file:").pack(side="left", padx=5)
+        self.stats_file_var = ctk.StringVar(value=self.config["stats_file"])
+        ctk.CTkEntry(options_frame, textvariable=self.stats_file_var,
+                    width=250).pack(side="left", padx=5)
+        ctk.CTkButton(options_frame, text="Save",
+                     command=self.save_stats_settings,
+                     width=80).pack(side="left", padx=5)
+        ctk.CTkButton(options_frame, text="Reset",
+                     command=self.stats.reset,
+                     width=80).pack(side="right", padx=5)
+        
+        ctk.CTkLabel(frame,
+                    text="(timings are collected from the next start, no overhead when disabled)",
+                    font=ctk.CTkFont(size=10),
+                    text_color="gray").pack(pady=2)
+        
+        self.stats_text = tk.Text(frame, wrap=tk.NONE,
+                                 bg="#2b2b2b", fg="#ffffff",
+                                 font=("Consolas", 10))
+        self.stats_text.pack(fill="both", expand=True, pady=5)
+        self.show_stats(None)
+        
     def create_control_panel(self):
         # Create control buttons at the bottom
         control_frame = ctk.CTkFrame(self.root)
@@ -565,10 +2972,80 @@ class VoiceShockApp:
                      command=self.minimize_to_tray,
                      height=40).pack(side="left", padx=5)
         
+    def load_audio_devices(self, reinitialize=False, show=True):
+        # Enumerate devices off the Tk thread, PortAudio and numpy are loaded
+        # here rather than before the window shows
+        try:
+            changed = self.device_registry.refresh(reinitialize=reinitialize)
+        except Exception as e:
+            self.log_message(f"Could not list audio devices: {e}", level="ERROR")
+            return
+        finally:
+            self.device_scan_pending = False
+        
+        if self.vu_samples is None:
+            # VU meter buffer, allocated here to load numpy off the Tk thread
+            self.vu_samples = np.zeros(4096, dtype=np.float32)
+        
+        if changed:
+            self.log_message("Audio devices changed")
+        if show or changed:
+            self.root.after(0, self.show_audio_devices)
+        
+    def refresh_audio_devices(self):
+        # Rescan devices on request, restarting PortAudio picks up new ones
+        if self.running:
+            self.log_message("Stop listening before refreshing audio devices", level="WARNING")
+            return
+        if self.device_scan_pending:
+            return
+        
+        self.device_scan_pending = True
+        self.log_message("Refreshing audio devices...")
+        threading.Thread(target=self.load_audio_devices, args=(True, True), daemon=True).start()
+        
+    def device_poll_ms(self):
+        # Hot-plug poll interval. Each poll restarts PortAudio, which is slow
+        # with WDM-KS/WASAPI on Windows, so it is never more often than this
+        return int(max(self.config["device_poll_s"], DEVICE_POLL_MIN_S) * 1000)
+        
+    def poll_audio_devices(self):
+        # Opt-in hot-plug check, only while idle since a rescan closes open streams
+        if not self.running and not self.window_hidden and not self.device_scan_pending:
+            self.device_scan_pending = True
+            threading.Thread(target=self.load_audio_devices, args=(True, False), daemon=True).start()
+        self.root.after(self.device_poll_ms(), self.poll_audio_devices)
+        
+    def show_audio_devices(self):
+        # Fill the device menus from the registry and select the saved devices
+        registry = self.device_registry
+        inputs = registry.input_devices()
+        loopbacks = registry.loopback_devices()
+        self.audio_device_ids = {device["label"]: device["id"] for device in inputs}
+        self.loopback_device_ids = {device["label"]: device["id"] for device in loopbacks}
+        
+        labels = list(self.audio_device_ids) or ["No devices found - Check audio settings"]
+        device = registry.resolve(self.config["audio_device_id"], self.config["audio_device"], default=True)
+        self.device_var.set(device["label"] if device and device["label"] in self.audio_device_ids else labels[0])
+        self.device_menu.configure(values=labels, state="normal" if inputs else "disabled")
+        
+        loopback_labels = list(self.loopback_device_ids) or ["No devices found - Check audio settings"]
+        device = registry.resolve(self.config["loopback_device_id"], self.config["loopback_device"])
+        self.loopback_device_var.set(device["label"] if device and device["label"] in self.loopback_device_ids
+                                     else loopback_labels[0])
+        self.loopback_menu.configure(values=loopback_labels, state="normal" if loopbacks else "disabled")
+        
+        self.log_message("Available audio devices:")
+        for label in labels:
+            self.log_message(f"  {label}")
+        
     def on_device_change(self, selection):
-        # Handle audio device change
-        device_index = int(selection.split(":")[0])
-        self.config["audio_device"] = device_index
+        # Handle audio device change, stored by id so it survives index shifts
+        device = self.device_registry.resolve(self.audio_device_ids.get(selection))
+        if device is None:
+            return
+        self.config["audio_device_id"] = device["id"]
+        self.config["audio_device"] = device["index"]
         self.log_message(f"Audio device changed to: {selection}")
         
     def on_loopback_toggle(self):
@@ -579,21 +3056,34 @@ class VoiceShockApp:
         
     def on_loopback_device_change(self, selection):
         # Handle loopback device change
-        device_index = int(selection.split(":")[0])
-        self.config["loopback_device"] = device_index
+        device = self.device_registry.resolve(self.loopback_device_ids.get(selection))
+        if device is None:
+            return
+        self.config["loopback_device_id"] = device["id"]
+        self.config["loopback_device"] = device["index"]
         self.log_message(f"Loopback device changed to: {selection}")
         
     def save_settings(self):
         # Save all settings
+        # Rebuild the recognizer if the grammar inputs changed while listening
+        if (self.wake_word_var.get() != self.config["wake_word"] or
+                self.command_grammar_var.get() != self.config["command_grammar"]):
+            self.engine.recognizer_dirty = True
+        
+        model_changed = self.model_var.get() != self.config["model_size"]
+        
         self.config["wake_word"] = self.wake_word_var.get()
         self.config["model_size"] = self.model_var.get()
         self.config["api_token"] = self.api_token_var.get()
         self.config["control_id"] = self.control_id_var.get()
         self.config["loopback_enabled"] = self.loopback_enabled_var.get()
         self.config["loopback_mix_ratio"] = self.mix_ratio_slider.get()
+        self.config["low_latency_mode"] = self.low_latency_var.get()
+        self.config["command_grammar"] = self.command_grammar_var.get()
+        self.config["vad_enabled"] = self.vad_enabled_var.get()
         
         # Get slider values
-        slider_keys = ["max_intensity", "duration_ms", "cooldown_seconds"]
+        slider_keys = ["max_intensity", "duration_ms", "cooldown_seconds", "coalesce_ms"]
         
         for key in slider_keys:
             slider = getattr(self, f"{key}_slider")
@@ -601,63 +3091,256 @@ class VoiceShockApp:
         
         self.save_config()
         
+        # Warm the newly selected model
+        if model_changed and not self.running:
+            self.preload_model()
+        
+    def save_stats_settings(self):
+        # Save stats settings only
+        self.config["stats_enabled"] = self.stats_enabled_var.get()
+        self.config["stats_file"] = self.stats_file_var.get().strip()
+        self.save_config()
+        if self.running:
+            self.log_message("Stats settings apply the next time listening starts")
+        
     def save_api_settings(self):
         # Save API settings only
         self.config["api_token"] = self.api_token_var.get()
         self.config["control_id"] = self.control_id_var.get()
+        self.config["control_backend"] = self.control_backend_var.get()
+        self.config["control_fallback_rest"] = self.control_fallback_var.get()
+        self.config["local_host"] = self.local_host_var.get().strip()
+        self.config["local_serial_port"] = self.local_serial_var.get().strip()
+        try:
+            self.config["local_port"] = int(self.local_port_var.get() or 0)
+        except ValueError:
+            self.log_message("Local hub port must be a number", level="ERROR")
         self.save_config()
         
-    def log_message(self, message, level="INFO"):
-        # Add msg to console
+    def setup_logging(self):
+        # Console lines go through a queue drained on the Tk thread, stdout and
+        # the optional rotating log file are written by a listener thread
+        self.log_queue = queue.SimpleQueue()
+        self.log_rate_limits = {}
+        
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if self.config["log_file"]:
+            try:
+                handlers.append(logging.handlers.RotatingFileHandler(
+                    self.config["log_file"], maxBytes=1024 * 1024, backupCount=3, encoding="utf-8"))
+            except Exception as e:
+                print(f"Error opening log file: {e}")
+        
+        formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", datefmt="%H:%M:%S")
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        record_queue = queue.SimpleQueue()
+        self.logger = logging.getLogger("pupshock")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [logging.handlers.QueueHandler(record_queue)]
+        self.log_listener = logging.handlers.QueueListener(record_queue, *handlers)
+        self.log_listener.start()
+        
+    def log_message(self, message, level="INFO", rate_limit=None):
+        # Queue msg for console and log file, safe to call from any thread
+        if rate_limit:
+            # Collapse repeats of noisy messages like audio status warnings
+            now = time.monotonic()
+            last, suppressed = self.log_rate_limits.get(rate_limit, (0.0, 0))
+            if now - last < LOG_RATE_LIMIT_S:
+                self.log_rate_limits[rate_limit] = (last, suppressed + 1)
+                return
+            self.log_rate_limits[rate_limit] = (now, 0)
+            if suppressed:
+                message += f" ({suppressed} similar messages suppressed)"
+        
         timestamp = time.strftime("%H:%M:%S")
-        formatted = f"[{timestamp}] [{level}] {message}\n"
+        self.log_queue.put(f"[{timestamp}] [{level}] {message}\n")
+        self.logger.log(logging.getLevelName(level), message)
         
-        self.console_text.insert(tk.END, formatted)
-        self.console_text.see(tk.END)
+    def drain_log_queue(self):
+        # Move queued log lines into the console in one batch
+        lines = []
+        try:
+            while len(lines) < 500:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if lines:
+            self.console_text.insert(tk.END, "".join(lines))
+            
+            # Cap scrollback
+            line_count = int(self.console_text.index("end-1c").split(".")[0])
+            excess = line_count - self.config["console_max_lines"]
+            if excess > 0:
+                self.console_text.delete("1.0", f"{excess + 1}.0")
+            
+            self.console_text.see(tk.END)
         
-        # Also print to standard output
-        print(formatted.strip())
+        self.root.after(100, self.drain_log_queue)
         
     def clear_console(self):
         # Clear console
         self.console_text.delete(1.0, tk.END)
         
+    def on_vu_resize(self, event):
+        # Move the static marker lines to the new size
+        for i, marker in enumerate(self.vu_markers):
+            x = int(event.width * i / 10)
+            self.vu_canvas.coords(marker, x, 0, x, event.height)
+        self.draw_vu_level()
+        
+    def start_vu_meter(self):
+        # Resume VU meter updates if suspended
+        if not self.vu_scheduled:
+            self.vu_scheduled = True
+            self.root.after(50, self.update_vu_meter)
+        
+    def measure_audio_level(self):
+        # RMS of the latest ~50ms of mic audio, read once per UI frame
+        source = self.engine.capture_sources.get("mic")
+        if source is None or self.vu_samples is None:
+            return 0.0
+        
+        count = min(len(self.vu_samples), source["rate"] // 20)
+        n = source["ring"].latest(self.vu_samples[:count])
+        if not n:
+            return 0.0
+        
+        samples = self.vu_samples[:n]
+        rms = math.sqrt(float(np.dot(samples, samples)) / n)
+        return min(1.0, rms * 10)  # Scale for visibility
+        
     def update_vu_meter(self):
         # Update VU meter display
-        if self.vu_canvas.winfo_exists():
-            width = self.vu_canvas.winfo_width()
-            height = self.vu_canvas.winfo_height()
-            
-            if width > 1 and height > 1:
-                self.vu_canvas.delete("all")
-                
-                # Draw background
-                self.vu_canvas.create_rectangle(0, 0, width, height, 
-                                               fill="#2b2b2b", outline="")
-                
-                # Draw level bar
-                level_width = int(width * self.current_audio_level)
-                
-                # Color gradient based on level
-                if self.current_audio_level < 0.3:
-                    color = "#00ff00"  # Green
-                elif self.current_audio_level < 0.7:
-                    color = "#ffff00"  # Yellow
-                else:
-                    color = "#ff0000"  # Red
-                
-                if level_width > 0:
-                    self.vu_canvas.create_rectangle(0, 0, level_width, height, 
-                                                   fill=color, outline="")
-                
-                # Draw markers
-                for i in range(0, 11):
-                    x = int(width * i / 10)
-                    self.vu_canvas.create_line(x, 0, x, height, 
-                                              fill="#555555", width=1)
+        self.vu_scheduled = False
+        
+        # Suspend completely while hidden in the tray or not listening
+        if self.window_hidden or not self.running or not self.vu_canvas.winfo_exists():
+            self.current_audio_level = 0
+            self.vu_peak = 0.0
+            self.draw_vu_level()
+            return
         
+        # Fast attack, smooth decay, peak hold for one second
+        level = self.measure_audio_level()
+        self.current_audio_level = max(level, self.current_audio_level * 0.8)
+        now = time.monotonic()
+        if level >= self.vu_peak:
+            self.vu_peak = level
+            self.vu_peak_time = now
+        elif now - self.vu_peak_time > 1.0:
+            self.vu_peak = max(level, self.vu_peak * 0.9)
+        
+        # Only redraw when the meter is visible
+        if self.root.state() != "iconic" and self.notebook.get() == "Audio":
+            self.draw_vu_level()
+        
+        self.vu_scheduled = True
         self.root.after(50, self.update_vu_meter)
         
+    def draw_vu_level(self):
+        # Move level bar and peak line to the current values
+        width = self.vu_canvas.winfo_width()
+        height = self.vu_canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return
+        
+        # Color gradient based on level
+        if self.current_audio_level < 0.3:
+            color = "#00ff00"  # Green
+        elif self.current_audio_level < 0.7:
+            color = "#ffff00"  # Yellow
+        else:
+            color = "#ff0000"  # Red
+        
+        self.vu_canvas.coords(self.vu_bar, 0, 0, int(width * self.current_audio_level), height)
+        self.vu_canvas.itemconfig(self.vu_bar, fill=color)
+        
+        peak_x = int(width * self.vu_peak)
+        self.vu_canvas.coords(self.vu_peak_line, peak_x, 0, peak_x, height)
+        
+    def set_status(self, text):
+        # Set status text, rendered by update_status_bar on the Tk thread
+        self.status_text = text
+        
+    def update_status_bar(self):
+        # Refresh status label with current decoder backlog
+        text = f"Status: {self.status_text}"
+        if self.running and self.engine.mixer is not None:
+            text += f" | Buffer: {self.engine.buffered_ms:.0f} ms"
+            if self.engine.degraded:
+                text += " (catching up)"
+        
+        if self.status_label.cget("text") != text:
+            self.status_label.configure(text=text)
+        
+        self.root.after(250, self.update_status_bar)
+        
+    def update_stats(self):
+        # Refresh the Stats tab and append to the JSONL file once per interval
+        stats = self.engine.stats
+        if self.running and stats:
+            self.collect_gauges(stats)
+            snapshot = None
+            
+            now = time.monotonic()
+            if self.config["stats_file"] and now - self.last_stats_dump >= self.config["stats_interval_s"]:
+                snapshot = stats.snapshot()
+                self.write_stats(snapshot)
+                self.last_stats_dump = now
+            
+            if not self.window_hidden and self.notebook.get() == "Stats":
+                self.show_stats(snapshot or stats.snapshot())
+        
+        self.root.after(1000, self.update_stats)
+        
+    def collect_gauges(self, stats):
+        # Sample queue depths and counters, read off the hot path
+        engine = self.engine
+        rings = [source["ring"] for source in list(engine.capture_sources.values())]
+        stats.set_gauge("buffered_ms", round(engine.buffered_ms))
+        stats.set_gauge("dropped_frames", sum(ring.dropped for ring in rings))
+        stats.set_gauge("ring_overflows", sum(ring.overflows for ring in rings))
+        stats.set_gauge("skipped_ms", round(engine.skipped_ms))
+        stats.set_gauge("chunks_seen", engine.chunks_seen)
+        stats.set_gauge("chunks_decoded", engine.decode_calls)
+        stats.set_gauge("api_queue_depth", self.dispatcher.jobs.qsize())
+        stats.set_gauge("log_queue_depth", self.log_queue.qsize())
+        if engine.mixer is not None:
+            stats.set_gauge("mixer_padded", engine.mixer.padded)
+            stats.set_gauge("mixer_trimmed", engine.mixer.trimmed)
+        
+    def write_stats(self, snapshot):
+        # Append one snapshot as a JSON line
+        try:
+            with open(self.config["stats_file"], 'a', encoding="utf-8") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        except Exception as e:
+            self.log_message(f"Error writing stats file: {e}", level="ERROR", rate_limit="stats_file")
+        
+    def show_stats(self, snapshot):
+        # Render a snapshot as a fixed width table
+        if snapshot is None:
+            text = "Enable Collect Stats and start listening to see hot path timings."
+        else:
+            lines = [f"{'timer':<20}{'count':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+            for name, timing in sorted(snapshot["timings"].items()):
+                lines.append(f"{name:<20}{timing['count']:>10}{timing['p50_ms']:>10.2f}"
+                             f"{timing['p95_ms']:>10.2f}{timing['p99_ms']:>10.2f}{timing['max_ms']:>10.2f}")
+            lines.append("")
+            for name, value in sorted(snapshot["gauges"].items()):
+                lines.append(f"{name:<20}{value:>10}")
+            text = "\n".join(lines)
+        
+        self.stats_text.configure(state="normal")
+        self.stats_text.delete("1.0", tk.END)
+        self.stats_text.insert("1.0", text)
+        self.stats_text.configure(state="disabled")
+        
     def toggle_listening(self):
         # Start/stop listening
         if not self.running:
@@ -667,15 +3350,28 @@ class VoiceShockApp:
             
     def start_listening(self):
         # Start audio processing
-        if not self.config["api_token"] or not self.config["control_id"]:
-            self.log_message("Please configure API token and Control ID first!", level="ERROR")
+        error = control_config_error(self.config)
+        if error:
+            self.log_message(error, level="ERROR")
             self.notebook.set("API")
             return
         
         self.running = True
         self.start_button.configure(text="Stop Listening")
-        self.status_label.configure(text="Status: Loading model...")
+        self.set_status("Loading model...")
         self.log_message("Starting voice control...")
+        self.start_vu_meter()
+        
+        # Timing hooks are only installed while stats are enabled
+        stats = self.stats if self.config["stats_enabled"] else None
+        if stats:
+            stats.reset()
+        self.engine.instrument(stats)
+        self.dispatcher.stats = stats
+        self.engine.on_command = stats.wrap("send_shock", self.send_shock) if stats else self.send_shock
+        
+        # Connect the control backend while the model loads
+        self.dispatcher.warm()
         
         # Start processing thread
         thread = threading.Thread(target=self.processing_thread, daemon=True)
@@ -685,7 +3381,7 @@ class VoiceShockApp:
         # Stop audio processing
         self.running = False
         self.start_button.configure(text="Start Listening :3")
-        self.status_label.configure(text="Status: Stopped")
+        self.set_status("Stopped")
         
         if self.stream:
             self.stream.stop()
@@ -696,294 +3392,204 @@ class VoiceShockApp:
             self.loopback_stream.stop()
             self.loopback_stream.close()
             self.loopback_stream = None
+        self.device_registry.in_use = False
         
+        self.dispatcher.close()
         self.log_message("Stopped listening")
+        self.engine.report()
+        self.controller.report()
+        self.dispatcher.report()
         
     def processing_thread(self):
         # Main audio processing thread
         try:
+            import sounddevice as sd
+            
             # Download model if needed
             if not self.download_model(self.config["model_size"]):
                 self.log_message("Failed to download model, cannot start", level="ERROR")
                 self.root.after(0, self.stop_listening)
                 return
             
-            # Load model
-            self.log_message(f"Loading {self.config['model_size']} model...")
+            # Load model, reusing a cached one if available
             model_path = self.get_model_path()
-            self.model = Model(model_path)
+            if self.model_manager.is_loaded(model_path):
+                self.log_message(f"Using cached {self.config['model_size']} model")
+            else:
+                self.log_message(f"Loading {self.config['model_size']} model...")
+            model = self.model_manager.get(model_path)
             
-            # Create recognizer with 16kHz sample rate
-            self.recognizer = KaldiRecognizer(self.model, 16000)
-            self.recognizer.SetWords(True)
+            # Create 16kHz recognizer, mixer and speech gate
+            self.engine.start_session(model, model_path)
             
             self.log_message("Model loaded successfully")
             
-            # Get device info
-            device_index = self.config["audio_device"]
-            device_info = sd.query_devices(device_index, 'input')
-            native_rate = int(device_info['default_samplerate'])
-            self.log_message(f"Using device: {device_info['name']}")
-            self.log_message(f"Native sample rate: {native_rate} Hz")
-            
-            # Start audio stream
-            self.stream = sd.InputStream(
-                samplerate=native_rate,
-                channels=1,
-                dtype="float32",
-                blocksize=self.config["chunk_size"],
-                device=device_index,
-                callback=self.audio_callback
-            )
-            self.stream.start()
-            
-            # Start system audio stream if enabled
-            if self.config["loopback_enabled"]:
-                try:
-                    loopback_index = self.config["loopback_device"]
-                    loopback_info = sd.query_devices(loopback_index)
-                    
-                    # Check if a WASAPI output device is being used for loopback
-                    is_wasapi_output = (loopback_info["max_output_channels"] > 0 and 
-                                       loopback_info["max_input_channels"] == 0)
-                    
-                    if is_wasapi_output:
-                        # Open output device as input
-                        self.log_message("Using WASAPI loopback mode")
-                        loopback_rate = int(loopback_info['default_samplerate'])
-                        
-                        
-                        self.loopback_stream = sd.InputStream(
-                            samplerate=loopback_rate,
-                            channels=1,
-                            dtype="float32",
-                            blocksize=self.config["chunk_size"],
-                            device=loopback_index,
-                            callback=self.loopback_audio_callback
-                        )
-                    else:
-                        # Regular input device
-                        loopback_rate = int(loopback_info['default_samplerate'])
-                        
-                        self.loopback_stream = sd.InputStream(
-                            samplerate=loopback_rate,
-                            channels=1,
-                            dtype="float32",
-                            blocksize=self.config["chunk_size"],
-                            device=loopback_index,
-                            callback=self.loopback_audio_callback
-                        )
-                    
-                    self.loopback_stream.start()
-                    self.log_message(f"Loopback device: {loopback_info['name']}")
-                    self.log_message(f"Mix ratio: {int(self.config['loopback_mix_ratio']*100)}% speaker")
-                except Exception as e:
-                    self.log_message(f"Failed to start loopback: {e}", level="WARNING")
-                    self.log_message("Try a different loopback device or check Windows audio settings", level="WARNING")
-                    self.log_message("Continuing with microphone only", level="WARNING")
+            # Hold the registry so a device rescan cannot restart PortAudio
+            # between resolving the devices and starting their streams, and
+            # mark it in use so later rescans leave PortAudio alone
+            with self.device_registry.lock:
+                self.device_registry.in_use = True
+                opened = self.open_streams(sd)
+            if not opened:
+                self.root.after(0, self.stop_listening)
+                return
             
-            self.status_label.configure(text="Status: Listening...")
+            self.set_status("Listening...")
             self.log_message(f"Listening for wake word: '{self.config['wake_word']}'")
+            names = [shocker["name"] for shocker in configured_shockers(self.config) if shocker["name"]]
+            if names:
+                self.log_message(f"Shockers: {', '.join(names)} (name one to target it, otherwise all)")
             
             # Main processing loop
+            cpu_start = time.thread_time()
+            wall_start = time.monotonic()
             while self.running:
-                try:
-                    chunk = self.audio_queue.get(timeout=0.1)
-                    self.process_audio_chunk(chunk, native_rate)
-                except queue.Empty:
-                    continue
+                if not self.engine.pump():
+                    time.sleep(0.005)
+            
+            # Report decoder load for this session
+            cpu = time.thread_time() - cpu_start
+            wall = time.monotonic() - wall_start
+            self.log_message(f"Processing thread CPU: {cpu:.1f} s over {wall:.0f} s ({100 * cpu / max(wall, 1e-6):.1f}%)")
                     
         except Exception as e:
             self.log_message(f"Error in processing thread: {e}", level="ERROR")
             self.root.after(0, self.stop_listening)
             
-    def audio_callback(self, indata, frames, time_info, status):
-        # Audio input callback
-        if status:
-            self.log_message(f"Audio status: {status}", level="WARNING")
-        
-        audio_data = indata[:, 0].copy()
+    def open_streams(self, sd):
+        # Open and start the microphone and loopback streams, returns False
+        # if there is no input device
+        # Resolve the saved device, its index may have shifted since it was chosen
+        device_info = self.device_registry.resolve(self.config["audio_device_id"], self.config["audio_device"],
+                                                   default=True)
+        if device_info is None:
+            self.log_message("No audio input device found", level="ERROR")
+            return False
+        device_index = device_info["index"]
+        self.log_message(f"Using device: {device_info['label']}")
+        capture_rate = self.negotiate_capture_rate(device_info)
+        
+        # Mixer combines all sources into one 16kHz stream
+        self.engine.add_source("mic", capture_rate, primary=True)
+        
+        # Start audio stream
+        callback = self.audio_callback
+        if self.engine.stats:
+            callback = self.engine.stats.wrap("audio_callback", callback)
+        self.stream = sd.InputStream(
+            samplerate=capture_rate,
+            channels=1,
+            dtype="float32",
+            blocksize=self.config["chunk_size"],
+            device=device_index,
+            callback=callback
+        )
+        self.stream.start()
         
-        # If loopback is enabled, apply mic mix ratio
+        # Start system audio stream if enabled
         if self.config["loopback_enabled"]:
-            mic_ratio = 1.0 - self.config["loopback_mix_ratio"]
-            audio_data = audio_data * mic_ratio
+            try:
+                loopback_info = self.device_registry.resolve(self.config["loopback_device_id"],
+                                                             self.config["loopback_device"])
+                if loopback_info is None:
+                    raise ValueError("loopback device not found")
+                loopback_index = loopback_info["index"]
+                
+                # Check if a WASAPI output device is being used for loopback
+                is_wasapi_output = (loopback_info["max_output_channels"] > 0 and 
+                                   loopback_info["max_input_channels"] == 0)
+                
+                if is_wasapi_output:
+                    # Open output device as input, shared mode only runs at the mix rate
+                    loopback_rate = int(loopback_info['default_samplerate'])
+                    self.log_message(f"Using WASAPI loopback mode at {loopback_rate} Hz")
+                    
+                    
+                    self.loopback_stream = sd.InputStream(
+                        samplerate=loopback_rate,
+                        channels=1,
+                        dtype="float32",
+                        blocksize=self.config["chunk_size"],
+                        device=loopback_index,
+                        callback=self.loopback_audio_callback
+                    )
+                else:
+                    # Regular input device
+                    loopback_rate = self.negotiate_capture_rate(loopback_info)
+                    
+                    self.loopback_stream = sd.InputStream(
+                        samplerate=loopback_rate,
+                        channels=1,
+                        dtype="float32",
+                        blocksize=self.config["chunk_size"],
+                        device=loopback_index,
+                        callback=self.loopback_audio_callback
+                    )
+                
+                self.engine.add_source("loopback", loopback_rate)
+                self.loopback_stream.start()
+                self.log_message(f"Loopback device: {loopback_info['label']}")
+                self.log_message(f"Mix ratio: {int(self.config['loopback_mix_ratio']*100)}% speaker")
+            except Exception as e:
+                self.engine.remove_source("loopback")
+                self.log_message(f"Failed to start loopback: {e}", level="WARNING")
+                self.log_message("Try a different loopback device or check Windows audio settings", level="WARNING")
+                self.log_message("Continuing with microphone only", level="WARNING")
+        
+        return True
+        
+    def negotiate_capture_rate(self, device_info):
+        # Capture at 16 kHz when the device or host API supports it so the
+        # resampler is bypassed, else at the native rate and resample
+        native_rate = int(device_info["default_samplerate"])
+        rate = native_rate
+        if self.config["prefer_16k_capture"] and native_rate != 16000:
+            rate = self.device_registry.capture_rate(device_info)
+        
+        if rate == 16000:
+            self.log_message(f"Capturing at 16000 Hz, no resampling (native rate {native_rate} Hz)")
+        else:
+            self.log_message(f"Capturing at {rate} Hz, resampling to 16000 Hz")
+        return rate
         
-        self.audio_queue.put(audio_data)
+    def audio_callback(self, indata, frames, time_info, status):
+        # Audio input callback
+        if status:
+            self.log_message(f"Audio status: {status}", level="WARNING", rate_limit="audio_status")
         
-        # Update VU meter
-        rms = np.sqrt(np.mean(audio_data ** 2))
-        self.current_audio_level = min(1.0, rms * 10)  # Scale for visibility
+        # VU meter reads the ring buffer once per UI frame
+        self.engine.capture_sources["mic"]["ring"].write(indata[:, 0])
         
     def loopback_audio_callback(self, indata, frames, time_info, status):
         # Loopback audio callback
         if status:
-            self.log_message(f"Loopback status: {status}", level="WARNING")
-        
-        loopback_data = indata[:, 0].copy()
-        
-        # Apply speaker mix ratio
-        speaker_ratio = self.config["loopback_mix_ratio"]
-        loopback_data = loopback_data * speaker_ratio
-        
-        # Add to queue
-        self.audio_queue.put(loopback_data)
-        
-    def process_audio_chunk(self, chunk, native_rate):
-        # Process a chunk of audio
-        # Skip if recognizer not ready
-        if not self.recognizer:
-            return
-        
-        # Resample to 16kHz if needed
-        chunk = self.resample_to_16k(chunk, native_rate)
-        
-        # Convert float32 to int16 for Vosk
-        audio_int16 = (chunk * 32767).astype(np.int16)
-        
-        # Feed to Vosk recognizer
-        if self.recognizer.AcceptWaveform(audio_int16.tobytes()):
-            # Final result - only process complete results
-            result = json.loads(self.recognizer.Result())
-            text = result.get("text", "").lower().strip()
-            
-            if text:
-                self.process_transcription(text)
-                
-    def extract_intensity(self, text: str) -> int | None:
-        # Extract intensity value from text, either as digits or written words
-        match = re.search(r"\b(\d{1,3})\b", text)
-        if match:
-            return int(match.group(1))
-        
-        # Convert written number words using word2number library
-        try:
-            # Extract all words that could be numbers
-            words = text.lower().split()
-            number_words = []
-            number_keywords = {'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine',
-                              'ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 
-                              'seventeen', 'eighteen', 'nineteen', 'twenty', 'thirty', 'forty', 'fifty',
-                              'sixty', 'seventy', 'eighty', 'ninety', 'hundred', 'and'}
-            
-            # Collect consecutive words that might form a number
-            for word in words:
-                if word in number_keywords:
-                    number_words.append(word)
-                elif number_words:
-                    # Try to convert accumulated words
-                    try:
-                        intensity = w2n.word_to_num(' '.join(number_words))
-                        return int(intensity)
-                    except:
-                        number_words = []
-            
-            # Try remaining words
-            if number_words:
-                try:
-                    intensity = w2n.word_to_num(' '.join(number_words))
-                    return int(intensity)
-                except:
-                    pass
-        except:
-            pass
-        
-        return None
-    
-    def process_transcription(self, text):
-        # Process transcribed text for wake word and commands
-        # Skip empty results
-        if not text:
-            self.has_speech = False
-            return
-        
-        self.last_command_text = text
-        self.log_message(f"Heard: {text}")
-        
-        # Check for wake word and command
-        if self.config["wake_word"] in text:
-            intensity = self.extract_intensity(text)
-            if intensity is not None:
-                self.send_shock(intensity)
-                self.reset_state()
-            else:
-                self.log_message("Wake word heard, no intensity")
-            
-    def resample_to_16k(self, audio, src_rate):
-        # Resample to 16khz
-        target_rate = 16000
-        if src_rate == target_rate:
-            return audio
-        duration = len(audio) / src_rate
-        target_len = int(duration * target_rate)
-        x_old = np.linspace(0, duration, len(audio), endpoint=False)
-        x_new = np.linspace(0, duration, target_len, endpoint=False)
-        return np.interp(x_new, x_old, audio).astype(np.float32)
-        
-    def reset_state(self):
-        # Reset all state variables
-        self.last_command_text = ""
-        self.last_speech_time = None
-        # Reset Vosk recognizer for fresh state
-        if self.recognizer:
-            self.recognizer = KaldiRecognizer(self.model, 16000)
-            self.recognizer.SetWords(True)
-        
-    def send_shock(self, intensity):
-        # Send shock command to API
-        now = time.time()
-        if now - self.last_action_time < self.config["cooldown_seconds"]:
-            self.log_message("Command heard, in cooldown", level="WARNING")
-            return
+            self.log_message(f"Loopback status: {status}", level="WARNING", rate_limit="loopback_status")
         
-        intensity = max(0, min(intensity, self.config["max_intensity"]))
+        # Mix ratio is applied by the mixer
+        self.engine.capture_sources["loopback"]["ring"].write(indata[:, 0])
         
-        payload = {
-            "shocks": [{
-                "id": self.config["control_id"],
-                "type": "Shock",
-                "intensity": intensity,
-                "duration": int(self.config["duration_ms"])
-            }],
-            "customName": "PupShockVoice"
-        }
+    def send_shock(self, command, trigger="final", speech_time=None):
+        # Send a ParsedCommand through the controller
+        self.controller.send_shock(command, trigger=trigger, speech_time=speech_time)
         
-        try:
-            response = requests.post(
-                "https://api.openshock.app/2/shockers/control",
-                headers={
-                    "OpenShockToken": self.config["api_token"],
-                    "Content-Type": "application/json",
-                    "User-Agent": "PupShockVoice/1.0"
-                },
-                json=payload,
-                timeout=5
-            )
-            
-            self.log_message(f"Shock {intensity}% - HTTP {response.status_code}")
-            
-            if response.ok:
-                self.last_action_time = now
-            else:
-                self.log_message(f"API Error: {response.text}", level="ERROR")
-                
-        except Exception as e:
-            self.log_message(f"Failed to send shock: {e}", level="ERROR")
-            
     def test_api(self):
        # Test API by sending 10% shock
-        if not self.config["api_token"] or not self.config["control_id"]:
-            self.log_message("Please enter API token and Control ID first!", level="ERROR")
+        error = control_config_error(self.config)
+        if error:
+            self.log_message(error, level="ERROR")
             return
         
         self.log_message("Testing API connection...")
-        self.send_shock(10)
+        self.send_shock(ParsedCommand(10), trigger=None)
         
     def minimize_to_tray(self):
         # Minimize app to system tray
         self.root.withdraw()
+        self.window_hidden = True
         
         if not self.tray_icon:
+            from pystray import Icon, Menu, MenuItem
+            
             # Create tray icon
             image = self.create_tray_icon()
             menu = Menu(
@@ -1007,6 +3613,7 @@ class VoiceShockApp:
     
     def _create_fallback_icon(self):
         # Create fallback icon if icon file is missing
+        from PIL import Image, ImageDraw
         width = 64
         height = 64
         image = Image.new('RGB', (width, height), color='black')
@@ -1032,6 +3639,7 @@ class VoiceShockApp:
             icon_path = self.get_resource_path('myicon.ico')
             if os.path.exists(icon_path):
                 # Load icon
+                from PIL import Image
                 image = Image.open(icon_path)
                 return image
             else:
@@ -1046,6 +3654,8 @@ class VoiceShockApp:
         self.root.deiconify()
         self.root.lift()
         self.root.focus_force()
+        self.window_hidden = False
+        self.start_vu_meter()
         
     def quit_app(self):
         # Quit application
@@ -1059,6 +3669,8 @@ class VoiceShockApp:
             self.stop_listening()
         
         self.save_config()
+        self.dispatcher.stop()
+        self.log_listener.stop()
         self.root.destroy()
         
         if self.tray_icon:
@@ -1069,13 +3681,121 @@ class VoiceShockApp:
     def run(self):
         # Run application
         self.log_message("Application started")
-        self.log_message(f"Available audio devices:")
-        for device in self.audio_devices:
-            self.log_message(f"  {device}")
-        
         self.root.mainloop()
 
 
-if __name__ == "__main__":
+def read_replay_audio(path, rate=16000):
+    # Load a WAV/FLAC file, or raw 16-bit mono PCM from stdin when path is "-",
+    # returns mono float32 samples and their sample rate
+    if path == "-":
+        data = sys.stdin.buffer.read()
+        samples = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+        return samples.astype(np.float32) / 32768, rate
+    
+    if path.lower().endswith(".wav"):
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            rate = wav.getframerate()
+            channels = wav.getnchannels()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        samples = samples.reshape(-1, channels).mean(axis=1)
+        return samples.astype(np.float32) / 32768, rate
+    
+    # FLAC and other formats need the optional soundfile package
+    try:
+        import soundfile
+    except ImportError:
+        raise ValueError(f"{path}: install soundfile to replay non-WAV files")
+    samples, rate = soundfile.read(path, dtype="float32", always_2d=True)
+    return samples.mean(axis=1).astype(np.float32), rate
+
+def replay(args):
+    # Run the recognition pipeline over recorded audio faster than real time
+    def log(message, level="INFO", rate_limit=None):
+        print(f"[{level}] {message}", file=sys.stderr)
+    
+    config = load_config_file(args.config)
+    model_path = args.model or get_model_path(config["model_size"])
+    if not os.path.exists(model_path):
+        log(f"Model not found: {model_path}", level="ERROR")
+        return 1
+    
+    controller = None
+    if not args.dry_run:
+        error = control_config_error(config)
+        if error:
+            log(f"{error} (or use --dry-run)", level="ERROR")
+            return 1
+        dispatcher = ShockDispatcher(config, log=log)
+        controller = ShockController(config, dispatcher, log=log)
+        dispatcher.warm()
+        if not dispatcher.wait_ready(5):
+            log(f"{config['control_backend']} backend not ready, commands may fall back or be dropped", level="WARNING")
+    
+    samples, rate = read_replay_audio(args.replay, args.rate)
+    duration = len(samples) / rate
+    clock = {"time": 0.0}
+    commands = []
+    
+    def on_command(command, trigger, speech_time):
+        # Timestamps are positions in the replayed audio
+        when = speech_time if speech_time is not None else clock["time"]
+        commands.append(command.intensity)
+        target = ", ".join(command.targets) if command.targets else "all"
+        print(f"{when:9.2f}s  {trigger:<7}  {command.intensity:3d}%  {command.mode:<7}  {target:<12}  "
+              f"{engine.last_command_text}", flush=True)
+        if controller:
+            controller.send_shock(command, trigger=trigger)
+    
+    from vosk import Model
+    t0 = time.perf_counter()
+    model = Model(model_path)
+    load_time = time.perf_counter() - t0
+    
+    engine = RecognitionEngine(config, log=log, on_command=on_command)
+    engine.start_session(model, model_path)
+    engine.add_source("replay", rate, primary=True)
+    
+    block_size = config["chunk_size"]
+    t0 = time.perf_counter()
+    for start in range(0, len(samples), block_size):
+        block = samples[start:start + block_size]
+        clock["time"] = (start + len(block)) / rate
+        engine.feed("replay", block, clock["time"])
+    engine.flush()
+    elapsed = time.perf_counter() - t0
+    
+    engine.report()
+    log(f"Model load {load_time:.2f} s")
+    log(f"Replayed {duration:.1f} s of {rate} Hz audio in {elapsed:.2f} s "
+        f"(RTF {elapsed / max(duration, 1e-9):.3f}, {duration / max(elapsed, 1e-9):.1f}x real time), "
+        f"{len(commands)} commands")
+    
+    if controller:
+        # Let queued requests finish before exiting
+        controller.dispatcher.flush()
+        controller.dispatcher.report()
+        controller.dispatcher.stop()
+    return 0
+
+def main():
+    # GUI by default, headless replay with --replay
+    parser = argparse.ArgumentParser(description="PupShock Voice")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="run recognition on a WAV/FLAC file, or raw 16-bit mono PCM from stdin with -")
+    parser.add_argument("--rate", type=int, default=16000, help="sample rate of raw PCM on stdin")
+    parser.add_argument("--dry-run", action="store_true", help="print commands without sending them")
+    parser.add_argument("--config", default="config.json", help="config file (default: config.json)")
+    parser.add_argument("--model", help="path to an extracted Vosk model, overrides model_size")
+    args = parser.parse_args()
+    
+    if args.replay:
+        return replay(args)
+    
     app = VoiceShockApp()
-    app.run()
\ No newline at end of file
+    app.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file